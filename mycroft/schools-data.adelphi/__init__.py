@@ -14,6 +14,8 @@
 
 import re
 import json
+import threading
+import time
 from requests import HTTPError, Response
 
 import mycroft.audio
@@ -27,51 +29,220 @@ from mycroft.util.format import (nice_date, nice_time, nice_number,
 from mycroft.util.parse import extract_datetime, extract_number
 from mycroft.util.time import now_local, to_utc, to_local
 
-import pandas as pd
-from . import schools
+from .school_data import metrics, normalize, payloads, schools, search, shared, snapshots
 
+# seconds between background refreshes of the school data
+REFRESH_INTERVAL = 24 * 60 * 60
 
-def parse_school(text):
+# number of recent school searches to remember
+QUERY_CACHE_SIZE = 256
+
+
+class EncodedMessage(Message):
     """
-        Look for school numbers in a tts utterance
-        because mycroft doesn't always put a space between the
-        letters and number(ms88 ->ms 88)
+    A Message whose data was already encoded with `payloads.dumps`,
+    so a cached answer isn't encoded again every time it's sent
     """
-    p = re.compile(r"^(.*?)\b([m|p|i]s)([0-9]*)\b(.*)$", re.IGNORECASE)
-    m = p.search(text)
-    if m:
-        return f"{m.group(1)}{m.group(2)} {m.group(3)}{m.group(4)}"
-    return text
+    def __init__(self, msg_type, data, encoded, context=None):
+        super().__init__(msg_type, data, context)
+        self.encoded = encoded
+
+    def serialize(self):
+        return '{"type":%s,"data":%s,"context":%s}' % (
+            json.dumps(self.msg_type), self.encoded, json.dumps(self.context))
+
+
+def school_list_message(t, page=0):
+    """the data_conversations:list message for a page of the schools in `t`"""
+    with metrics.stage('school_list_payload') as stage:
+        bus_data = payloads.school_list(t, page)
+        bus_data['view'] = 'school-list'
+        bus_data['title'] = "Which school do you want to see?"
+        encoded = payloads.dumps(bus_data)
+        stage.rows = len(bus_data['rows'])
+    return EncodedMessage('data_conversations:list', bus_data, encoded)
+
 
 class SchoolDataSkill(MycroftSkill):
     def __init__(self):
         super().__init__("SchoolDataSkill")
 
     def initialize(self):
-        """load the school demographic data from datahub and keep it local"""
-        self.demo_df = schools.load_demographics()
+        """
+        start answering from the last local snapshot of the school
+        demographic data and refresh it from datahub in the background
+        """
+        # (version, frame) of the data being served, swapped as a pair
+        self.demo = (0, None)
         self.context_df = None
+        self.updated = None
+        # the snapshot version (ETag) of the frame being served
+        self.loaded_from = None
+        self.refreshing = threading.Lock()
+        self.query_cache = search.QueryCache(QUERY_CACHE_SIZE)
+        self.setup_metrics()
+
+        # the cleaned frame, shared with the notebooks and other processes
+        # frames published by a version of the skill with another schema are skipped
+        self.shared = shared.demographics()
+
+        store = snapshots.default_store()
+        cached = snapshots.SnapshotStore(store.path, offline=True)
+        try:
+            try:
+                # memory-mapped, so it opens at once
+                _, df = self.shared.read()
+                loaded_from = self.shared.manifest().get('source')
+            except (OSError, ValueError):
+                df = schools.load_demographics(store=cached, compact=True)
+                loaded_from = self.snapshot_version(store)
+            self.swap(df)
+            self.loaded_from = loaded_from
+            self.updated = self.snapshot_time(store)
+        except (OSError, ValueError) as e:
+            LOG.info(f"No local school data yet, waiting for the download: {e}")
+        self.emit_status()
+
+        self.add_event('data_conversations:list.page', self.handle_list_page)
+        self.add_event('data_conversations:metrics.report', self.handle_metrics_report)
+
+        self.refresh()
+        self.schedule_repeating_event(self.refresh, None, REFRESH_INTERVAL,
+            name="refresh_school_data")
+
+    def setup_metrics(self):
+        """
+        time the school data stages when the `metrics` setting is "on"
+        (or "memory" to trace memory too) or SCHOOL_DATA_METRICS is set
+        """
+        mode = self.settings.get('metrics', 'off')
+        if mode in ('on', 'memory'):
+            metrics.enable(memory=mode == 'memory')
+        if metrics.ENABLED:
+            metrics.add_listener(self.report_metric)
+
+    def report_metric(self, stage, record):
+        """log each stage, and send it to the web UI if `metrics_bus` is set"""
+        LOG.info(json.dumps({'stage': stage, **record}))
+        # checkbox settings can come back as the strings "true" and "false"
+        if str(self.settings.get('metrics_bus', False)).lower() == 'true':
+            self.bus.emit(Message('data_conversations:metrics', {'stage': stage, **record}))
+
+    def handle_metrics_report(self, message):
+        """send every stage recorded so far"""
+        self.bus.emit(Message('data_conversations:metrics',
+            {'enabled': metrics.ENABLED, 'stages': metrics.report()}))
+
+    @property
+    def demo_df(self):
+        return self.demo[1]
+
+    def swap(self, df):
+        """start serving `df`, and forget the answers found in the old frame"""
+        version = self.demo[0] + 1
+        self.demo = (version, df)
+        self.query_cache.clear()
+
+    def snapshot_time(self, store):
+        meta = store.meta(schools.DEMOGRAPHICS_ID, schools.DEMOGRAPHICS_SCHEMA)
+        return meta["fetched_at"] if meta else None
+
+    def snapshot_version(self, store):
+        return store.version(schools.DEMOGRAPHICS_ID, schools.DEMOGRAPHICS_SCHEMA)
+
+    def is_current(self, store):
+        """the frame being served came from the snapshot in `store`"""
+        return self.demo_df is not None and self.loaded_from is not None \
+            and self.loaded_from == self.snapshot_version(store)
+
+    def is_stale(self):
+        """the data hasn't been checked against datahub within the snapshot ttl"""
+        ttl = snapshots.default_store().ttl
+        return self.updated is None or time.time() - self.updated > ttl
+
+    def refresh(self, message=None):
+        """reload the school data in a worker thread, unless a reload is running"""
+        if not self.refreshing.acquire(blocking=False):
+            return
+        threading.Thread(target=self.load_in_background, daemon=True).start()
+        self.emit_status()
+
+    def load_in_background(self):
+        try:
+            store = snapshots.default_store()
+            meta = store.meta(schools.DEMOGRAPHICS_ID, schools.DEMOGRAPHICS_SCHEMA)
+            if store.is_fresh(meta) and self.is_current(store):
+                # startup just loaded this snapshot, nothing to do
+                return
+
+            df = schools.load_demographics(store=store, compact=True)
+            self.updated = self.snapshot_time(store)
+            if self.is_current(store):
+                # revalidated, the portal's data hasn't changed: keep the
+                # frame, its search index and the cached answers
+                return
+
+            # build the search index before the first question needs it
+            search.school_index(df)
+
+            # handlers read self.demo once, so they see either the
+            # old frame or the new one, never a partial update
+            self.swap(df)
+            self.loaded_from = self.snapshot_version(store)
+            # only a new snapshot makes a new shared version for the readers to map
+            self.shared.publish(df, source=self.loaded_from)
+        except Exception as e:
+            LOG.warning(f"Could not refresh the school data: {e}")
+        finally:
+            self.refreshing.release()
+            self.emit_status()
+
+    def emit_status(self):
+        df = self.demo_df
+        bus_data = {'ready': df is not None,
+          'stale': self.is_stale(),
+          'refreshing': self.refreshing.locked(),
+          'updated': self.updated,
+          'rows': 0 if df is None else len(df),
+          'cache': self.query_cache.stats()}
+        self.bus.emit(Message('data_conversations:status', bus_data))
 
 
 
     @intent_handler("school.intent")
     def handle_school(self, message):
         qry = message.data['school']
-        qry = parse_school(qry)
-
-        t = schools.find_school(self.demo_df, qry)
-        self.context_df = t
-
-        bus_data = {'data': pd.DataFrame.to_json(t.school_name, orient='records'),
-          'view': 'school-list',
-          'title':"Which school do you want to see?"}
-
-
-        self.bus.emit(Message('data_conversations:list', bus_data))
+        qry = normalize.query(qry)
+
+        version, df = self.demo
+        if df is None:
+            self.speak("I'm still loading the school data, ask me again in a minute")
+            return
+
+        with metrics.stage('handle_school') as stage:
+            # the search results and their first page, ready to send again
+            key = (version, qry)
+            cached = self.query_cache.get(key)
+            if cached is None:
+                t = schools.find_school(df, qry)
+                cached = (t, school_list_message(t))
+                self.query_cache.put(key, cached)
+
+            t, list_message = cached
+            self.context_df = t
+            self.bus.emit(list_message)
+            stage.rows = len(t)
 
         self.speak(f"looking for school called {qry}")
 
 
+    def handle_list_page(self, message):
+        """send another page of the last search results, when the web UI asks for it"""
+        if self.context_df is None:
+            return
+        page = int(message.data.get('page', 0))
+        self.bus.emit(school_list_message(self.context_df, page))
+
 
 def create_skill():
     return SchoolDataSkill()
@@ -1 +0,0 @@
-/home/mxc/Projects/data-conversations/notebooks/schools.py
\ No newline at end of file
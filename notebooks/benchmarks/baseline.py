@@ -0,0 +1,251 @@
+"""
+The original row-at-a-time implementations from schools.py, kept
+as the reference the optimized versions are tested and timed against.
+"""
+import random
+import re
+import numpy as np
+import pandas as pd
+from scipy import stats
+from ksdisc import ks_disc_2sample
+from fuzzywuzzy import fuzz
+from school_data.schools import BOROS, pct_to_float, school_type, short_name, make_test_cols
+
+
+def clean_name(sn):
+    sn = sn.lower()
+    sn = sn.strip()
+    sn = sn.replace(".", "")
+    clean = []
+    for word in sn.split(" "):
+        try:
+            n = int(word)
+            clean.append(str(n))
+        except:
+            clean.append(word)
+
+    sn = " ".join(clean)
+
+    p = re.compile(r"\b([m|p|i]s [0-9]*)")
+    m = p.search(sn)
+    if m:
+        sn = sn.replace(m.group(0), "")
+    return sn
+
+
+def clean_demographics(df):
+    # figure out what grades they teach
+    df["pk"] = df["grade_3k_pk_half_day_full"] > 0
+    df["elementary"] = df["grade_2"] > 0
+    df["middle"] = df["grade_7"] > 0
+    df["hs"] = df["grade_10"] > 0
+
+    # parse data from dbn
+    df["year"] = df.year.apply(lambda year: int(year[:4]))
+    df["district"] = df.dbn.apply(lambda dbn: int(dbn[:2]))
+    df["school_num"] = df.dbn.apply(lambda dbn: int(dbn[3:]))
+    df["boro"] = df.dbn.apply(lambda dbn: dbn[2])
+    df["boro_name"] = df.boro.apply(lambda x: BOROS[x])
+
+    # make it easier to look up schools
+    df["school_type"] = df.apply(school_type, axis=1)
+
+    df["clean_name"] = df.apply(lambda row: clean_name(row.school_name), axis=1)
+
+    df["short_name"] = df.apply(short_name, axis=1)
+
+    # add a few demo groups
+    df["non_white"] = df.total_enrollment - df.white
+    df["non_white_1"] = df.non_white / df.total_enrollment
+
+    df["black_hispanic"] = df.black + df.hispanic
+    df["black_hispanic_1"] = df.black_hispanic / df.total_enrollment
+
+    df["white_asian"] = df.white + df.asian
+    df["white_asian_1"] = df.white_asian / df.total_enrollment
+
+    df["non_white_asian"] = df.total_enrollment - df.white_asian
+    df["non_white_asian_1"] = df.non_white_asian / df.total_enrollment
+
+    # list comprehension to get the columns that should be a %
+    pct_cols = [col for col in df.columns if col.endswith("_1") and col != "grade_1"]
+
+    df = df.apply(lambda row: pct_to_float(row, pct_cols), axis=1)
+
+    for col in pct_cols:
+        df[col] = pd.to_numeric(df[col])
+
+    return df
+
+
+def find_school(df, qry):
+    t = df.copy(deep=False)
+    latest = t.year.max()
+
+    # first lookup by number
+    t = t.query(f"short_name == '{qry.upper()}' and year=={latest}")
+    if len(t) > 0:
+        return t
+
+    # fuzzy search
+    t = df.copy(deep=False)
+
+    t["match"] = t.clean_name.apply(lambda sn: fuzz.token_set_ratio(qry, sn))
+    t = t.query(f"match > 80 and year=={latest}")
+    t = pd.DataFrame(t)
+    # now sort the results based on the ratio match
+    t["match"] = t.clean_name.apply(lambda sn: fuzz.ratio(qry, sn))
+    t = t.sort_values(by=["match"], ascending=False)
+
+    return t
+
+
+def segregation_test(demo_df):
+    """
+    Here we perform the chi-square test to see the segregation of the
+    ethnic populations for each school...
+    Let us recall that we want to compare the distribution at the level
+    of district with the distribution at the level of school.
+    We have four cathegories asian, black, white and hispanic;
+    each school has its own observed frequencies f_obs and we are going to
+    compare with the expected frequencies f_exp from the distribution at the district level...
+    """
+
+    # The probabilities from the district level...
+    N_total    = demo_df.groupby(["district","year"]).agg('sum')
+    p_asian    = N_total["asian"]/N_total["total_enrollment"]
+    p_white    = N_total["white"]/N_total["total_enrollment"]
+    p_black    = N_total["black"]/N_total["total_enrollment"]
+    p_hispanic = N_total["hispanic"]/N_total["total_enrollment"]
+    p_multrace = N_total["multiple_race_categories"]/N_total["total_enrollment"]
+
+    # Data at the level of school...
+    N_school   = demo_df.groupby(["district","year","school_name"]).agg('sum')
+
+    y_data = []
+    d_data = []
+    school_name_data = []
+    chi2_pvalue_data = []
+    chi2_value_data  = []
+    KS_pvalue_data   = []
+    for i in range(0, len(demo_df)):
+        d = int(demo_df.loc[i,"district"])
+        d_data.append(d)
+        y = int(demo_df.loc[i,"year"])
+        y_data.append(y)
+        sch_name = demo_df.loc[i,"school_name"]
+        school_name_data.append(sch_name)
+        # This are the observed frequencies f_obs...by school in district "d" and for year "y"...
+        x_asian    = N_school.loc[(d,y,sch_name),"asian"]
+        x_white    = N_school.loc[(d,y,sch_name),"white"]
+        x_black    = N_school.loc[(d,y,sch_name),"black"]
+        x_hispanic = N_school.loc[(d,y,sch_name),"hispanic"]
+        x_multrace = N_school.loc[(d,y,sch_name),"multiple_race_categories"]
+        f_obs      = [x_asian, x_white, x_black, x_hispanic, x_multrace]
+        # This are the expected frequencies f_exp...by school in district "d" and for year "y"...
+        m_asian    = p_asian[(d,y)] * N_school.loc[(d,y,sch_name),"total_enrollment"]
+        m_white    = p_white[(d,y)] * N_school.loc[(d,y,sch_name),"total_enrollment"]
+        m_black    = p_black[(d,y)] * N_school.loc[(d,y,sch_name),"total_enrollment"]
+        m_hispanic = p_hispanic[(d,y)] * N_school.loc[(d,y,sch_name),"total_enrollment"]
+        m_multrace = p_multrace[(d,y)] * N_school.loc[(d,y,sch_name),"total_enrollment"]
+        f_exp      = [m_asian, m_white, m_black, m_hispanic, m_multrace]
+        # Chi_square statistic and p-value
+        chi2 = stats.chisquare(f_obs,f_exp)
+        chi2_value_data.append(chi2[0])
+        chi2_pvalue_data.append(chi2[1])
+        # Let us note that we can also compute also the KS test as follows from the above data
+        sample1 = np.concatenate((np.ones(int(round(m_asian))), 2*np.ones(int(round(m_white))), 3*np.ones(int(round(m_black))),
+                             4*np.ones(int(round(m_hispanic))), 5*np.ones(int(round(m_multrace)))))
+        sample2 = np.concatenate((np.ones(int(x_asian)), 2*np.ones(int(x_white)), 3*np.ones(int(x_black)),
+                             4*np.ones(int(x_hispanic)), 5*np.ones(int(x_multrace))))
+        list1 = sample1.tolist()
+        list2 = sample2.tolist()
+        if (len(list1)==len(list2)):
+            KS_pvalue = ks_disc_2sample( list1, list2 )
+            KS_pvalue_data.append( KS_pvalue )
+        elif (len(list1) > len(list2)):
+            random_item_from_list = random.choice(list1)
+            list1.remove(random_item_from_list)
+            KS_pvalue = ks_disc_2sample( list1, list2 )
+            KS_pvalue_data.append( KS_pvalue )
+        elif (len(list1) < len(list2)):
+            random_item_from_list = random. choice(list2)
+            list2.remove(random_item_from_list)
+            KS_pvalue = ks_disc_2sample( list1, list2 )
+            KS_pvalue_data.append( KS_pvalue )
+
+    # Since the script spent some time until finish, it is better to have the data in a .csv file
+    # Below we construct that file...
+    header_csv = " p_value_chi2test, chi2_value_chi2test, p_value_KStest      "
+    Dls_modif_to_dat = np.column_stack( ( chi2_pvalue_data, chi2_value_data, KS_pvalue_data ) )
+    np.savetxt( 'segregation_tests.csv',
+	    Dls_modif_to_dat, delimiter=',', header= header_csv, fmt=['%18.12E','%18.12E','%18.12E'] )
+
+
+    return (chi2_pvalue_data, chi2_value_data, KS_pvalue_data)
+
+
+def rows_to_cols(cat, grade, test_df, prefix="math"):
+    """
+        get the test result rows for one (category, grade)
+        combination and make them columns in a new dataframe
+    """
+
+    # all of the cols that contain test-related data
+    test_cols = ['number_tested',
+        'mean_scale_score',
+        'level_1',
+        'level_1_1',
+        'level_2',
+        'level_2_1',
+        'level_3',
+        'level_3_1',
+        'level_4',
+        'level_4_1',
+        'level_3_4',
+        'level_3_4_1']
+    temp_df = test_df.query(f"category == '{cat}' and grade == '{grade}'")
+    new_cols = [f"{prefix}_{cat}_grade_{grade}_{col}" for col in test_cols]
+    rename = dict(zip(test_cols, new_cols))
+    temp_df = temp_df.rename(columns = rename)
+    temp_df = temp_df.drop(["grade", "category"], axis=1)
+    temp_df.set_index(["dbn", "year"])
+    return temp_df
+
+def combine_test_data(df, test_df, test_type="math"):
+    """
+    Combine test result data with the schools dataframe to make a wide
+    data set where row data from test results (grade and demographic category)
+    become columns in the new combined dataframe
+    - df: the schools DataFrame
+    - test_df: the DataFrame with the test results
+    - test_type: either math or ela
+    """
+
+    # cat all combinations of test takers
+    combos = make_test_cols(test_df)
+
+    # get an array of df for each combo
+    grade_cat_results = [rows_to_cols(cat, grade, test_df, test_type) for cat, grade in combos]
+
+
+    # merge the category dataframes in with the school data
+    combined = df.copy()
+    for t in grade_cat_results:
+        combined = combined.merge(t,on=["dbn", "year"], how="left")
+
+    return combined
+
+
+def calc_changes(df, start, end, col):
+    """the row-by-row change from changes.ipynb, 0 for schools without a `start` year"""
+    latest = df.query(f"year == {end}").copy()
+
+    def calc_change(row):
+        dbn = row["dbn"]
+        first = df.query(f"dbn == '{dbn}' and year == {start}")
+        if len(first) != 1:
+            return 0
+        return float(row[col]) - float(first[col])
+
+    return latest.apply(calc_change, axis=1)
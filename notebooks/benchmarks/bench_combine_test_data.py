@@ -0,0 +1,36 @@
+"""
+Times combine_test_data, and measures its peak memory, with one merge per
+(category, grade) against the single reshape, on synthetic demographics
+and test results.
+
+    python -m benchmarks.bench_combine_test_data [--schools 300 1800]
+"""
+import argparse
+import io
+
+import pandas as pd
+from school_data import schools, synthetic
+from benchmarks import baseline
+from benchmarks.timing import measure
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--schools", type=int, nargs="+", default=[300, 1800])
+    args = parser.parse_args()
+
+    print(f"{'schools':>8} {'cols':>6} {'merges (s)':>11} {'(MB)':>8} {'reshape (s)':>12} {'(MB)':>8} {'speedup':>8}")
+    for n in args.schools:
+        df = schools.clean_demographics(synthetic.make_demographics(n))
+        raw = synthetic.make_tests(n)
+        raw = pd.read_csv(io.StringIO(raw.to_csv(index=False)))
+        tests = schools.clean_test_data_categories(raw)
+
+        slow, slow_mb, expected = measure(lambda: baseline.combine_test_data(df, tests, "math"))
+        fast, fast_mb, result = measure(lambda: schools.combine_test_data(df, tests, "math"))
+        pd.testing.assert_frame_equal(expected, result, check_exact=True)
+        print(f"{n:>8} {result.shape[1]:>6} {slow:>11.3f} {slow_mb:>8.1f} {fast:>12.3f} {fast_mb:>8.1f} {slow / fast:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+"""
+Times the row-wise and vectorized demographic cleaning on synthetic
+data at 1x, 10x and 100x the size of the real table (~9k rows).
+
+    python -m benchmarks.bench_demographics [--scales 1 10 100]
+"""
+import argparse
+
+import pandas as pd
+from school_data import schools, synthetic
+from benchmarks import baseline
+from benchmarks.timing import best_time
+
+# roughly the number of schools in the open data snapshot
+N_SCHOOLS = 1800
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'scale':>6} {'rows':>9} {'row-wise (s)':>13} {'vectorized (s)':>15} {'speedup':>8}")
+    for scale in args.scales:
+        raw = synthetic.make_demographics(N_SCHOOLS * scale)
+        # the baseline is slow, time it once at the larger sizes
+        repeat = args.repeat if scale == 1 else 1
+        slow, expected = best_time(baseline.clean_demographics, repeat, raw.copy)
+        fast, result = best_time(schools.clean_demographics, args.repeat, raw.copy)
+        pd.testing.assert_frame_equal(expected, result, check_exact=True)
+        print(f"{scale:>6} {len(raw):>9} {slow:>13.3f} {fast:>15.3f} {slow / fast:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
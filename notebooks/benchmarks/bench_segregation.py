@@ -0,0 +1,34 @@
+"""
+Times segregation_test in one process and split by district across
+1 to N worker processes, on synthetic data.
+
+    python -m benchmarks.bench_segregation [--schools 1800] [--workers 1 2 4]
+"""
+import argparse
+import os
+
+from school_data import schools, segregation, synthetic
+from benchmarks.timing import best_time
+
+
+def main():
+    cores = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--schools", type=int, default=1800)
+    parser.add_argument("--workers", type=int, nargs="+",
+        default=sorted({1, 2, 4, cores} & set(range(1, cores + 1))))
+    parser.add_argument("--repeat", type=int, default=1)
+    args = parser.parse_args()
+
+    df = schools.clean_demographics(synthetic.make_demographics(args.schools))
+    single, _ = best_time(lambda: segregation.segregation_stats(df, seed=0), args.repeat)
+    print(f"{len(df)} rows, {cores} cores")
+    print(f"{'workers':>8} {'seconds':>9} {'speedup':>8}")
+    print(f"{'single':>8} {single:>9.3f} {1:>7.2f}x")
+    for n in args.workers:
+        seconds, _ = best_time(lambda: segregation.partitioned_stats(df, n_jobs=n, seed=0), args.repeat)
+        print(f"{n:>8} {seconds:>9.3f} {single / seconds:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+Times and memory-profiles each stage of the schools.py pipeline on
+synthetic open data, without the network, and saves the results as JSON.
+
+    python -m benchmarks.run [--schools 1800] [--repeat 3] [--output results.json]
+    python -m benchmarks.run --compare old.json [--tolerance 1.5]
+
+Each stage is run `repeat` times for the best time, and once more under
+tracemalloc for the peak memory it allocates. With --compare, stages that
+got slower than `tolerance` times the old result are listed and the
+exit status is 1.
+"""
+import argparse
+import json
+import platform
+import sys
+import tempfile
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+from school_data import aggregates, schema, schools, snapshots, synthetic
+from benchmarks.timing import measure
+
+# fuzzy and short name searches for the find_school stage
+QUERIES = ["roberto clemente", "park slope elementary", "bronx arts academy",
+    "ps 17", "hs 637", "pan american", "o'brien middle school", "math & science"]
+
+
+def find_schools(df):
+    # a fresh copy, so the search index is built as part of the stage
+    df = df.copy()
+    return [schools.find_school(df, qry) for qry in QUERIES]
+
+
+def stages(paths, tmp):
+    """
+    The pipeline stages as (name, function) in the order they run.
+    Each function takes the dict of the results of the earlier stages.
+    """
+    store = snapshots.SnapshotStore(tmp, offline=True)
+    return [
+        ("read_demographics", lambda out: pd.read_csv(paths["demographics"])),
+        ("clean_demographics", lambda out: schools.clean_demographics(out["read_demographics"].copy())),
+        ("save_snapshot", lambda out: store.write(out["clean_demographics"],
+            schools.DEMOGRAPHICS_ID, schools.DEMOGRAPHICS_SCHEMA)),
+        ("load_demographics", lambda out: schools.load_demographics(store=store)),
+        ("compact_demographics", lambda out: schema.compact(out["clean_demographics"], schema.DEMOGRAPHICS)),
+        ("find_school", lambda out: find_schools(out["clean_demographics"])),
+        ("resolve_schools", lambda out: schools.resolve_schools(out["clean_demographics"],
+            out["read_demographics"].school_name.unique()[:500])),
+        ("calc_districts", lambda out: schools.calc_districts(out["clean_demographics"])),
+        ("rollup_aggregates", lambda out: aggregates.rollup(out["clean_demographics"])),
+        ("calc_changes", lambda out: schools.calc_changes(out["clean_demographics"], 2015, 2019,
+            ["poverty_1", "black_1", "total_enrollment"])),
+        ("read_math_tests", lambda out: pd.read_csv(paths["math"])),
+        ("clean_math_tests", lambda out: schools.clean_test_data_categories(out["read_math_tests"].copy())),
+        ("combine_test_data", lambda out: schools.combine_test_data(
+            out["clean_demographics"], out["clean_math_tests"], "math")),
+        ("segregation_test", lambda out: schools.segregation_test(out["clean_demographics"], seed=0)),
+    ]
+
+
+def size(result):
+    """rows in a stage's result, for the report"""
+    if isinstance(result, (pd.DataFrame, pd.Series)):
+        return len(result)
+    if isinstance(result, tuple):
+        return len(result[0])
+    if isinstance(result, list):
+        return sum(size(r) for r in result)
+    return None
+
+
+def run_benchmarks(n_schools=1800, repeat=3, seed=0):
+    """
+    Run every stage on synthetic data for `n_schools` schools and return
+    the results as a dict that can be saved as JSON.
+    """
+    results = {}
+    outputs = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = synthetic.write_csvs(tmp, n_schools, seed=seed)
+        for name, f in stages(paths, tmp):
+            seconds, peak, outputs[name] = measure(lambda: f(outputs), repeat)
+            results[name] = {"seconds": seconds, "peak_mb": peak, "rows": size(outputs[name])}
+
+    return {
+        "created": datetime.now(timezone.utc).isoformat(),
+        "n_schools": n_schools,
+        "repeat": repeat,
+        "seed": seed,
+        "versions": {"python": platform.python_version(), "pandas": pd.__version__,
+            "numpy": np.__version__},
+        "stages": results,
+    }
+
+
+def compare(results, old, tolerance):
+    """the names of the stages that are more than `tolerance` times slower than in `old`"""
+    slower = []
+    for name, stage in results["stages"].items():
+        before = old["stages"].get(name)
+        if before and stage["seconds"] > tolerance * before["seconds"]:
+            slower.append(name)
+    return slower
+
+
+def print_report(results, old=None):
+    print(f"{'stage':<22} {'rows':>9} {'seconds':>9} {'peak MB':>9}" + (f" {'vs old':>8}" if old else ""))
+    for name, stage in results["stages"].items():
+        line = f"{name:<22} {stage['rows'] or '':>9} {stage['seconds']:>9.4f} {stage['peak_mb']:>9.1f}"
+        if old and name in old["stages"]:
+            line += f" {stage['seconds'] / old['stages'][name]['seconds']:>7.2f}x"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--schools", type=int, default=1800)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="save the results to this JSON file")
+    parser.add_argument("--compare", help="a JSON file of earlier results")
+    parser.add_argument("--tolerance", type=float, default=1.5)
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.schools, args.repeat, args.seed)
+
+    old = None
+    if args.compare:
+        with open(args.compare) as f:
+            old = json.load(f)
+    print_report(results, old)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if old is not None:
+        slower = compare(results, old, args.tolerance)
+        if slower:
+            print(f"slower than {args.tolerance}x the old results: {', '.join(slower)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
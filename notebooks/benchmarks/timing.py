@@ -0,0 +1,41 @@
+"""
+Timing and memory helpers shared by the benchmark scripts.
+"""
+import time
+import tracemalloc
+
+
+def best_time(f, repeat=1, setup=None):
+    """
+    Call f `repeat` times and return (best seconds, result of the last call).
+    - setup: function called before each run, outside the timing, f is
+             called with what it returns (e.g. a fresh copy of the input)
+    """
+    times = []
+    for _ in range(repeat):
+        args = () if setup is None else (setup(),)
+        start = time.perf_counter()
+        result = f(*args)
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def peak_memory(f):
+    """call f once under tracemalloc, return (peak MB allocated, result)"""
+    tracemalloc.start()
+    try:
+        result = f()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak / 2 ** 20, result
+
+
+def measure(f, repeat=1):
+    """
+    (best seconds, peak MB, result) of calling f. The memory is measured
+    in one more call, so tracemalloc doesn't slow down the timed ones.
+    """
+    seconds, result = best_time(f, repeat)
+    peak, _ = peak_memory(f)
+    return seconds, peak, result
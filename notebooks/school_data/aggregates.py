@@ -0,0 +1,116 @@
+"""
+District, borough and citywide totals of the demographic data.
+
+`calc_districts` groups every school row each time it is called, and the
+borough and citywide numbers were added up by hand in the notebooks.
+`rollup` makes all three levels in one pass: the schools are summed once
+by (district, boro, year), which is small, and the three levels are sums
+of those sums. The result is a table indexed by (level, area, year):
+
+    level     area   year
+    district  "02"   2018   sums, num_schools and the _pct columns
+    district  "13"   2018
+    boro      "K"    2018
+    city      "NYC"  2018
+
+`Aggregates` wraps the table for lookups, and `materialize` saves it
+next to the demographic snapshot so that it is only recalculated when
+the snapshot changes.
+"""
+import os
+
+import pandas as pd
+
+from . import schema
+
+# the counts that are summed, as in calc_districts
+SUMS = ['total_enrollment', 'black', 'white', 'asian', 'hispanic',
+    'multiple_race_categories', 'students_with_disabilities',
+    'english_language_learners', 'poverty', 'non_white', 'black_hispanic',
+    'white_asian', 'non_white_asian']
+
+LEVELS = ["district", "boro", "city"]
+CITY = "NYC"
+
+
+def rollup(df):
+    """
+    Sum the schools DataFrame `df` by district, boro and the whole city
+    for each year, with the share of total_enrollment for each count.
+    """
+    data = df[["district", "boro", "year"] + SUMS].copy()
+    data["poverty"] = schema.to_number(data.poverty)
+    data["num_schools"] = df.dbn.notna().astype(int)
+    data["boro"] = data.boro.astype(str)
+
+    cols = SUMS + ["num_schools"]
+    fine = data.groupby(["district", "boro", "year"], observed=True)[cols].sum()
+
+    districts = fine.groupby(["district", "year"]).sum().reset_index()
+    # two digits like the dbn, so that the districts sort in order
+    districts["area"] = districts.pop("district").map("{:02d}".format)
+    boros = fine.groupby(["boro", "year"]).sum().reset_index()
+    boros["area"] = boros.pop("boro")
+    city = fine.groupby("year").sum().reset_index()
+    city["area"] = CITY
+
+    table = pd.concat([districts, boros, city], keys=LEVELS, names=["level", None])
+    table = table.reset_index(level=0).set_index(["level", "area", "year"])
+    for col in SUMS:
+        table[col + "_pct"] = table[col] / table.total_enrollment
+    return table.sort_index()
+
+
+class Aggregates:
+    def __init__(self, table):
+        """
+        - table: the output of `rollup`
+        """
+        self.table = table if table.index.is_monotonic_increasing else table.sort_index()
+
+    def lookup(self, level, area, year=None):
+        """
+        The totals for one area, a row for a single `year` or a frame
+        indexed by year when `year` is None. Raises KeyError if the area
+        or year isn't in the data.
+        """
+        if year is None:
+            return self.table.loc[(level, str(area))]
+        return self.table.loc[(level, str(area), year)]
+
+    def district(self, district, year=None):
+        return self.lookup("district", f"{int(district):02d}", year)
+
+    def boro(self, boro, year=None):
+        return self.lookup("boro", boro, year)
+
+    def city(self, year=None):
+        return self.lookup("city", CITY, year)
+
+    def level(self, level):
+        """every area of a level, one row per (area, year)"""
+        return self.table.loc[level]
+
+
+def materialize(df, store, dataset_id, schema):
+    """
+    Return the Aggregates of the snapshot `schema` of `dataset_id` in the
+    SnapshotStore `store`, whose data is `df`. The table is saved in the
+    store as "<schema>-aggregates" and reused until the snapshot file
+    is replaced. When there is no snapshot file the table is calculated
+    and not saved.
+    """
+    name = schema + "-aggregates"
+    try:
+        source = os.path.getmtime(store.data_path(dataset_id, schema))
+    except FileNotFoundError:
+        return Aggregates(rollup(df))
+
+    meta = store.meta(dataset_id, name)
+    if meta is not None and meta.get("source_mtime") == source:
+        return Aggregates(store.read(dataset_id, name))
+
+    table = rollup(df)
+    store.write(table, dataset_id, name, meta={"dataset": dataset_id, "schema": name,
+        "source_mtime": source, "rows": len(table)})
+    return Aggregates(table)
@@ -0,0 +1,205 @@
+"""
+Year-by-year ingestion of the open data sets.
+
+The city adds a school year to the demographics and test datasets once a
+year, but a `SnapshotStore` downloads and cleans the whole history every
+time the dataset changes. A `YearPartitions` directory keeps one Parquet
+file of cleaned rows per school year, and `ingest` only asks the portal
+for the years that aren't there yet:
+
+    parts = YearPartitions("~/.cache/school_data/nie4-bv6q.demographics-2.years")
+    new = ingest(url, parts, clean=clean_demographics)
+    df = parts.read()
+
+Years are kept the way the portal writes them in the `year` column
+("2019-20" for demographics, 2019 for test results), so they can be put
+straight into a SoQL `$where` clause. Derived tables (like the district
+sums) can be saved next to the partitions with `write_table`.
+
+Datasets too big to download and clean in one go can be streamed:
+`csv_chunks` parses the response as it arrives and `csv_pages` pages
+through it with $offset, while `write_chunks` cleans and saves each
+chunk before the next one is read.
+
+    rows = write_chunks(csv_chunks(url, 50000), path, clean=clean_demographics)
+    df = read_chunks(path)
+"""
+import io
+import json
+import os
+import shutil
+
+import pandas as pd
+import requests
+
+from . import snapshots
+
+
+class YearPartitions:
+    def __init__(self, path):
+        """
+        - path: directory that holds one parquet file per year
+        """
+        self.path = os.path.expanduser(path)
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.path, "years.json")
+
+    def years(self):
+        """the years that have been saved, in the order they were added"""
+        try:
+            with open(self.manifest_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return []
+
+    def year_path(self, year):
+        return os.path.join(self.path, f"year={year}.parquet")
+
+    def table_path(self, name):
+        return os.path.join(self.path, f"{name}.parquet")
+
+    def write(self, df, year):
+        """save the cleaned rows for `year`, replacing any earlier copy"""
+        snapshots.write_parquet(df, self.year_path(year))
+        years = self.years()
+        if year not in years:
+            snapshots.write_json(years + [year], self.manifest_path)
+
+    def read(self, years=None):
+        """the saved rows for `years` (default all of them) as one frame"""
+        if years is None:
+            years = self.years()
+        frames = [snapshots.read_parquet(self.year_path(year)) for year in sorted(years)]
+        if not frames:
+            return pd.DataFrame()
+        return pd.concat(frames, ignore_index=True)
+
+    def read_table(self, name):
+        """a derived table saved with `write_table`, or None"""
+        path = self.table_path(name)
+        return snapshots.read_parquet(path) if os.path.exists(path) else None
+
+    def write_table(self, df, name):
+        snapshots.write_parquet(df, self.table_path(name))
+
+
+def partitions(store, dataset_id, schema):
+    """the YearPartitions for a dataset, inside a SnapshotStore's directory"""
+    return YearPartitions(os.path.join(store.path, store.key(dataset_id, schema) + ".years"))
+
+
+def soql_literal(year):
+    return f"'{year}'" if isinstance(year, str) else str(year)
+
+
+def portal_years(url, timeout=300):
+    """the distinct values of the year column of the dataset at `url`"""
+    response = requests.get(url, params={"$select": "year", "$group": "year"}, timeout=timeout)
+    response.raise_for_status()
+    years = pd.read_csv(io.BytesIO(response.content)).year
+    return years.tolist()
+
+
+def fetch_year(url, year, timeout=300, dtype=None):
+    """the raw rows of the dataset at `url` for one year"""
+    response = requests.get(url, params={"$where": f"year={soql_literal(year)}"}, timeout=timeout)
+    response.raise_for_status()
+    return pd.read_csv(io.BytesIO(response.content), dtype=dtype)
+
+
+def ingest(url, parts, clean=None, timeout=300, dtype=None):
+    """
+    Download, clean and save the years of the dataset at `url` that
+    aren't in `parts` yet. Return the cleaned new rows, an empty frame
+    when every year is already saved.
+    - clean: the function that cleans the raw rows of a year
+    - dtype: dtypes for read_csv, a year where a text column only has
+      numbers would otherwise be read as numbers
+    """
+    saved = set(parts.years())
+    frames = []
+    for year in portal_years(url, timeout):
+        if year in saved:
+            continue
+        df = fetch_year(url, year, timeout, dtype)
+        if clean is not None:
+            df = clean(df)
+        parts.write(df, year)
+        frames.append(df)
+
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames, ignore_index=True)
+
+
+def csv_chunks(url, chunksize, timeout=300, dtype=None):
+    """
+    Read the CSV at `url` as it downloads, `chunksize` rows at a time,
+    without holding the whole response in memory.
+    """
+    with requests.get(url, stream=True, timeout=timeout) as response:
+        response.raise_for_status()
+        response.raw.decode_content = True
+        yield from pd.read_csv(response.raw, chunksize=chunksize, dtype=dtype)
+
+
+def csv_pages(url, page_size, timeout=300, dtype=None):
+    """
+    Read the dataset at the Socrata resource `url` (without a $limit)
+    one page of `page_size` rows at a time, using $limit and $offset
+    in the order of the row ids.
+    """
+    offset = 0
+    while True:
+        params = {"$limit": page_size, "$offset": offset, "$order": ":id"}
+        response = requests.get(url, params=params, timeout=timeout)
+        response.raise_for_status()
+        page = pd.read_csv(io.BytesIO(response.content), dtype=dtype)
+        if len(page) > 0:
+            yield page
+        if len(page) < page_size:
+            return
+        offset += page_size
+
+
+def write_chunks(chunks, path, clean=None):
+    """
+    Clean each frame from `chunks` and save it as the next part of the
+    dataset in the directory `path`, so that only one chunk is in
+    memory at a time. The parts replace the old ones when the last
+    chunk is written. Return the number of rows written.
+    """
+    path = os.path.expanduser(path)
+    tmp = path + ".tmp"
+    if os.path.exists(tmp):
+        shutil.rmtree(tmp)
+    os.makedirs(tmp)
+
+    rows = 0
+    for i, chunk in enumerate(chunks):
+        if clean is not None:
+            chunk = clean(chunk)
+        chunk.index = pd.RangeIndex(rows, rows + len(chunk))
+        chunk.to_parquet(os.path.join(tmp, f"part-{i:05d}.parquet"), index=True)
+        rows += len(chunk)
+
+    if os.path.exists(path):
+        old = path + ".old"
+        os.replace(path, old)
+        os.replace(tmp, path)
+        shutil.rmtree(old)
+    else:
+        os.replace(tmp, path)
+    return rows
+
+
+def read_chunks(path):
+    """the parts saved by `write_chunks` as one frame"""
+    path = os.path.expanduser(path)
+    parts = sorted(name for name in os.listdir(path) if name.endswith(".parquet"))
+    frames = [snapshots.read_parquet(os.path.join(path, name)) for name in parts]
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames)
@@ -0,0 +1,164 @@
+"""
+Opt-in timing of the stages of loading, cleaning and searching the data.
+
+When the assistant is slow it is hard to tell if the time goes to the
+download, the cleaning, the fuzzy search or the statistics. With metrics
+turned on, each stage records how long it took, how many rows it returned
+and, optionally, the peak memory it allocated:
+
+    metrics.enable(memory=True)
+    df = schools.load_demographics()
+    metrics.report()
+    # {"clean_demographics": {"calls": 1, "seconds": 0.41, "total_seconds": 0.41,
+    #                         "rows": 9500, "peak_mb": 48.2}, ...}
+
+Listeners added with `add_listener` are called with (stage, record) after
+every stage, the Mycroft skill uses one to log the metrics and send them
+on the message bus. Setting the `SCHOOL_DATA_METRICS` environment variable
+to 1 (or "memory") turns them on at import.
+
+When metrics are off, a timed function costs one extra function call.
+"""
+import functools
+import os
+import threading
+import time
+import tracemalloc
+
+ENABLED = False
+MEMORY = False
+
+_records = {}
+_listeners = []
+_lock = threading.Lock()
+
+
+def enable(memory=False):
+    """
+    Start recording stages.
+    - memory: also trace the peak memory of each stage with tracemalloc,
+              which makes everything a few times slower
+    """
+    global ENABLED, MEMORY
+    ENABLED = True
+    MEMORY = memory
+
+
+def disable():
+    global ENABLED, MEMORY
+    ENABLED = False
+    MEMORY = False
+
+
+def add_listener(listener):
+    """call `listener(stage, record)` after each stage is recorded"""
+    _listeners.append(listener)
+
+
+def remove_listener(listener):
+    if listener in _listeners:
+        _listeners.remove(listener)
+
+
+def report():
+    """the records of every stage so far, as a dict of stage to record"""
+    with _lock:
+        return {stage: dict(record) for stage, record in _records.items()}
+
+
+def reset():
+    with _lock:
+        _records.clear()
+
+
+def rows(result):
+    """the number of rows in a stage's result, None if it doesn't have rows"""
+    if isinstance(result, tuple) and result:
+        return rows(result[0])
+    if hasattr(result, "shape"):
+        return result.shape[0] if result.shape else None
+    if isinstance(result, list):
+        return len(result)
+    return None
+
+
+def record(stage, seconds, n_rows=None, peak_mb=None):
+    with _lock:
+        entry = _records.setdefault(stage, {"calls": 0, "total_seconds": 0.0})
+        entry["calls"] += 1
+        entry["seconds"] = seconds
+        entry["total_seconds"] += seconds
+        entry["rows"] = n_rows
+        entry["peak_mb"] = peak_mb
+        entry = dict(entry)
+    for listener in list(_listeners):
+        listener(stage, entry)
+
+
+class Stage:
+    def __init__(self, name):
+        """
+        Time a block of code as the stage `name`, set `rows`
+        to record the number of rows it made.
+        """
+        self.name = name
+        self.rows = None
+
+    def __enter__(self):
+        # only the outermost stage traces memory, a nested one
+        # would see the peak of the stage it is part of
+        self.tracing = MEMORY and not tracemalloc.is_tracing()
+        if self.tracing:
+            tracemalloc.start()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self.start
+        peak_mb = None
+        if self.tracing:
+            peak_mb = tracemalloc.get_traced_memory()[1] / 2 ** 20
+            tracemalloc.stop()
+        if exc[0] is None:
+            record(self.name, seconds, self.rows, peak_mb)
+        return False
+
+
+class _Off:
+    """the stage used when metrics are off"""
+    rows = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_OFF = _Off()
+
+
+def stage(name):
+    """a context manager that records the block inside it as the stage `name`"""
+    return Stage(name) if ENABLED else _OFF
+
+
+def timed(name=None):
+    """decorate a function to record each call as a stage, named after the function by default"""
+    def decorator(f):
+        stage_name = name or f.__name__
+
+        @functools.wraps(f)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return f(*args, **kwargs)
+            with Stage(stage_name) as s:
+                result = f(*args, **kwargs)
+                s.rows = rows(result)
+            return result
+        return wrapper
+    return decorator
+
+
+if os.environ.get("SCHOOL_DATA_METRICS", "").lower() in ("1", "true", "yes", "memory"):
+    enable(memory=os.environ["SCHOOL_DATA_METRICS"].lower() == "memory")
@@ -0,0 +1,158 @@
+"""
+Normalizing school names and spoken questions about them.
+
+The same 2,000 or so school names come back every year and on every
+reload, and people ask about the same schools over and over. The
+patterns are compiled once, and `NAMES` remembers the clean name and
+short name prefix of every raw `school_name` it has seen, so a reload
+only normalizes the names that are new:
+
+    clean, prefix = NAMES.lookup(["P.S. 015 Roberto Clemente"])
+    # [" roberto clemente"], ["PS"]
+
+    query("show me ms88 in brooklyn")  # "show me ms 88 in brooklyn"
+"""
+import functools
+import re
+import threading
+
+import numpy as np
+import pandas as pd
+
+# the school number at the start of a name, e.g. "ps 9"
+SCHOOL_NUMBER_PATTERN = re.compile(r"\b([m|p|i]s [0-9]*)")
+
+# leading zeros of a word that is all digits
+LEADING_ZEROS_PATTERN = re.compile(r"(?<![^ ])0+(?=[0-9]+(?![^ ]))")
+
+# a word with digits that isn't plain 0-9, but that int() might still read
+ODD_NUMBER_PATTERN = re.compile(r"(?<![^ ])(?![0-9]+(?![^ ]))[\s+\-_\d]*\d[\s+\-_\d]*(?![^ ])")
+
+# a school number said without a space, e.g. "ms88"
+SPOKEN_NUMBER_PATTERN = re.compile(r"^(.*?)\b([m|p|i]s)([0-9]*)\b(.*)$", re.IGNORECASE)
+
+# the short name prefix for the ways the abbreviations are written
+PREFIXES = [("PS", ["P.S.", "P. S."]), ("MS", ["M.S.", "M. S."]), ("IS", ["I. S.", "I.S."])]
+
+# names and queries remembered by `clean_name` and `query`
+NAME_CACHE_SIZE = 65536
+QUERY_CACHE_SIZE = 4096
+
+
+@functools.lru_cache(maxsize=NAME_CACHE_SIZE)
+def clean_name(sn):
+    """
+    The school name `sn` in lower case without dots, leading zeros
+    or its school number, for fuzzy matching.
+    """
+    sn = sn.lower()
+    sn = sn.strip()
+    sn = sn.replace(".", "")
+    clean = []
+    for word in sn.split(" "):
+        # only words with a digit can be numbers
+        if any(c.isdigit() for c in word):
+            try:
+                word = str(int(word))
+            except ValueError:
+                pass
+        clean.append(word)
+
+    sn = " ".join(clean)
+
+    m = SCHOOL_NUMBER_PATTERN.search(sn)
+    if m:
+        sn = sn.replace(m.group(0), "")
+    return sn
+
+
+def clean_names(names):
+    """
+    `clean_name` for a Series of school names
+    """
+    sn = names.str.lower().str.strip().str.replace(".", "", regex=False)
+
+    # int("015") == 15: drop the leading zeros of numbers. Names with words
+    # that int() reads in less obvious ways ("+5", "1_0") go the slow way
+    odd = sn.str.contains(ODD_NUMBER_PATTERN)
+    sn = sn.str.replace(LEADING_ZEROS_PATTERN, "", regex=True)
+    if odd.any():
+        sn[odd] = names[odd].map(clean_name)
+
+    # like clean_name, remove every copy of the first "ps 9" found
+    found = sn.str.extract(SCHOOL_NUMBER_PATTERN, expand=False)
+    has_num = found.notna() & ~odd
+    sn[has_num] = [name.replace(num, "") for name, num in zip(sn[has_num], found[has_num])]
+    return sn
+
+
+def name_prefixes(names):
+    """
+    The short name prefix ("PS", "MS" or "IS") written in each of the
+    Series of school names, None when the name doesn't have one
+    """
+    sn = names.str.upper()
+    found = [sn.str.contains(abbr, regex=False) for _, abbrs in PREFIXES for abbr in abbrs]
+    conditions = [found[0] | found[1], found[2] | found[3], found[4] | found[5]]
+    return np.select(conditions, [prefix for prefix, _ in PREFIXES], None)
+
+
+class NameTable:
+    def __init__(self):
+        """
+        A thread safe table of the clean name and short name
+        prefix of every raw school name looked up so far.
+        """
+        self.names = {}
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.names)
+
+    def lookup(self, names):
+        """
+        The clean names and prefixes of the distinct school `names`
+        as two arrays, normalizing only the names not seen before.
+        """
+        new = [name for name in names if name not in self.names]
+        if new:
+            new = pd.Series(list(dict.fromkeys(new)), dtype=object)
+            found = zip(new, zip(clean_names(new), name_prefixes(new)))
+            with self.lock:
+                self.names.update(found)
+
+        entries = [self.names[name] for name in names]
+        clean = np.array([c for c, _ in entries], dtype=object)
+        prefixes = np.array([p for _, p in entries], dtype=object)
+        return clean, prefixes
+
+    def clear(self):
+        with self.lock:
+            self.names.clear()
+
+
+# the names seen by every load in this process
+NAMES = NameTable()
+
+
+def parse_school(text):
+    """
+        Look for school numbers in a tts utterance
+        because mycroft doesn't always put a space between the
+        letters and number(ms88 ->ms 88)
+    """
+    m = SPOKEN_NUMBER_PATTERN.search(text)
+    if m:
+        return f"{m.group(1)}{m.group(2)} {m.group(3)}{m.group(4)}"
+    return text
+
+
+def normalize_query(qry):
+    """lower case with single spaces, so "PS  9" and "ps 9" are the same question"""
+    return " ".join(qry.lower().split())
+
+
+@functools.lru_cache(maxsize=QUERY_CACHE_SIZE)
+def query(text):
+    """a spoken question about a school, normalized for `find_school` and the query cache"""
+    return normalize_query(parse_school(text))
@@ -0,0 +1,61 @@
+"""
+Message bus payloads for the web UI's data views.
+
+The skill used to send search results as `DataFrame.to_json` inside the
+bus message, a JSON string inside JSON that the web client had to parse
+twice, with every column of every match. `school_list` builds the
+`data_conversations:list` payload as plain lists of only the fields the
+view shows, one page at a time:
+
+    {"fields": ["dbn", "short_name", "school_name", "match"],
+     "rows": [["13K009", "PS 9", "P.S. 009 Teunis G. Bergen", 86], ...],
+     "page": 0, "page_size": 25, "pages": 3, "total": 61}
+
+`dumps` encodes a payload once, with orjson when it is installed, so a
+cached answer can be sent again without encoding it again.
+"""
+import json
+import math
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# the columns the school-list view needs, match is only set for fuzzy matches
+LIST_FIELDS = ["dbn", "short_name", "school_name", "match"]
+
+# schools sent in one page of results
+PAGE_SIZE = 25
+
+
+def column_values(df, col):
+    """the values of `col` as Python objects, None for missing values and missing columns"""
+    if col not in df:
+        return [None] * len(df)
+    values = df[col].astype(object)
+    return values.where(values.notna(), None).tolist()
+
+
+def school_list(t, page=0, page_size=PAGE_SIZE, fields=LIST_FIELDS):
+    """
+    The payload for one page of the search results `t` (from `find_school`),
+    in the order of `t`. A page past the end has no rows.
+    """
+    total = len(t)
+    start = page * page_size
+    rows = t.iloc[start:start + page_size]
+    columns = [column_values(rows, col) for col in fields]
+    return {"fields": list(fields),
+        "rows": [list(row) for row in zip(*columns)],
+        "page": page,
+        "page_size": page_size,
+        "pages": math.ceil(total / page_size),
+        "total": total}
+
+
+def dumps(payload):
+    """`payload` as a compact JSON string"""
+    if orjson is not None:
+        return orjson.dumps(payload).decode()
+    return json.dumps(payload, separators=(",", ":"), ensure_ascii=False)
@@ -0,0 +1,126 @@
+"""
+Compact dtypes for the cleaned demographics and test result frames.
+
+`clean_demographics` and `clean_test_data_categories` leave every label
+as a Python string and every count as an int64, and the "s" that marks
+suppressed test results keeps whole score columns as strings. The schemas
+here declare a smaller dtype for each column:
+
+- labels that repeat (dbn, names, boro, category, grade) are categoricals
+- whole numbers with known ranges (year, district) get a fixed small int
+- counts get the smallest of int16/int32/int64 that holds them
+- columns with suppression markers become nullable numbers, with the
+  marker as a missing value
+
+    df = compact(clean_demographics(raw), DEMOGRAPHICS)
+
+Columns that aren't in the schema are left as they are.
+"""
+import numpy as np
+import pandas as pd
+
+CATEGORY = "category"
+
+# whole numbers stored in the smallest of COUNT_TYPES that fits them
+COUNT = "count"
+COUNT_TYPES = [np.int16, np.int32, np.int64]
+
+# values the portal uses in place of a number that can't be published
+SUPPRESSED = ["s", "Above 95%", "Below 5%"]
+
+DEMOGRAPHICS = {
+    "dbn": CATEGORY,
+    "school_name": CATEGORY,
+    "year": "int16",
+    "district": "int8",
+    "school_num": "int16",
+    "boro": CATEGORY,
+    "boro_name": CATEGORY,
+    "school_type": CATEGORY,
+    "clean_name": CATEGORY,
+    "short_name": CATEGORY,
+    "economic_need_index": CATEGORY,
+    "poverty": "Int32",
+}
+for col in ["total_enrollment", "grade_3k_pk_half_day_full", "grade_k", "grade_1",
+        "grade_2", "grade_3", "grade_4", "grade_5", "grade_6", "grade_7", "grade_8",
+        "grade_9", "grade_10", "grade_11", "grade_12", "female", "male", "asian",
+        "black", "hispanic", "multiple_race_categories", "white",
+        "students_with_disabilities", "english_language_learners", "non_white",
+        "black_hispanic", "white_asian", "non_white_asian"]:
+    DEMOGRAPHICS[col] = COUNT
+
+TESTS = {
+    "dbn": CATEGORY,
+    "grade": CATEGORY,
+    "category": CATEGORY,
+    "year": "int16",
+    "number_tested": COUNT,
+    "mean_scale_score": "Float64",
+}
+for level in ["level_1", "level_2", "level_3", "level_4", "level_3_4"]:
+    TESTS[level] = "Int32"
+    TESTS[level + "_1"] = "Float64"
+
+
+def to_count(series):
+    """`series` as the smallest int in COUNT_TYPES that holds its values"""
+    if len(series) == 0:
+        return series.astype(COUNT_TYPES[0])
+    lo, hi = series.min(), series.max()
+    for t in COUNT_TYPES:
+        info = np.iinfo(t)
+        if info.min <= lo and hi <= info.max:
+            return series.astype(t)
+    return series.astype(COUNT_TYPES[-1])
+
+
+def to_int(series, dtype):
+    """`series` as the numpy int `dtype`, which has to hold every value"""
+    info = np.iinfo(dtype)
+    if len(series) and (series.min() < info.min or series.max() > info.max):
+        raise ValueError(f"{series.name} has values outside the range of {dtype}")
+    return series.astype(dtype)
+
+
+def to_nullable(series, dtype):
+    """
+    `series` as the nullable `dtype` ("Int32", "Float64"), with the
+    SUPPRESSED markers as missing values
+    """
+    if series.dtype == object:
+        series = pd.to_numeric(series.mask(series.isin(SUPPRESSED)))
+    return series.astype(dtype)
+
+
+def to_number(series):
+    """
+    `series` as numbers for sums and differences, with the SUPPRESSED
+    markers (poverty is "Above 95%" or "Below 5%" for some schools) and
+    any other text as NaN. Columns that are already numbers are returned
+    as they are.
+    """
+    if series.dtype != object:
+        return series
+    return pd.to_numeric(series.mask(series.isin(SUPPRESSED)), errors="coerce")
+
+
+def convert(series, dtype):
+    if dtype == COUNT:
+        return to_count(series)
+    if dtype == CATEGORY:
+        return series.astype(CATEGORY)
+    dtype = pd.api.types.pandas_dtype(dtype)
+    if isinstance(dtype, np.dtype):
+        return to_int(series, dtype)
+    return to_nullable(series, dtype)
+
+
+def compact(df, schema):
+    """
+    Return a copy of `df` with each column in `schema` converted to
+    its declared dtype. Raises ValueError when a column doesn't fit.
+    """
+    cols = {col: convert(df[col], schema[col]) if col in schema else df[col].copy()
+        for col in df.columns}
+    return pd.DataFrame(cols, index=df.index)
@@ -1,15 +1,61 @@
+import importlib
 import pandas as pd
 import re
-from fuzzywuzzy import fuzz
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
 from itertools import chain
-from scipy import stats
-import random
-from ksdisc import ks_disc_2sample
 import numpy as np
+from pandas.api.extensions import take
+from . import aggregates, metrics, normalize, schema, search, snapshots, sources
+from .normalize import clean_name, clean_names
+
+"""
+Open data portal datasets
+"""
+RESOURCE_URL = "https://data.cityofnewyork.us/resource/{}.csv"
+OPEN_DATA_URL = RESOURCE_URL + "?$limit=10000000"
+DEMOGRAPHICS_ID = "nie4-bv6q"
+MATH_TESTS_ID = "m27t-ht3h"
+ELA_TESTS_ID = "qkpp-pbi8"
+CHARTER_MATH_ID = "3xsw-bpuy"
+
+# bump this whenever the cleaning functions change the shape or values
+# of the frames they return, so old local snapshots aren't reused
+SCHEMA_VERSION = 2
+DEMOGRAPHICS_SCHEMA = f"demographics-{SCHEMA_VERSION}"
+TESTS_SCHEMA = f"tests-{SCHEMA_VERSION}"
+
+# rows read and cleaned at a time by the streaming loaders
+CHUNK_SIZE = 50000
+
+BOROS = {"M":"Manhattan", "K": "Brooklyn", "X":"Bronx", "R":"Staten Island", "Q":"Queens"}
+
+# "Below 5%", "Above 95%" or a number followed by a % sign
+PCT_PATTERN = re.compile(r"^(?:(?=.*(?P<below>Below))|(?=.*(?P<above>Above))|(?P<number>.*).)", re.S)
 
 """
 Constants for subsets of columns
 """
+# all of the cols that contain test-related data
+TEST_COLS = ['number_tested',
+    'mean_scale_score',
+    'level_1',
+    'level_1_1',
+    'level_2',
+    'level_2_1',
+    'level_3',
+    'level_3_1',
+    'level_4',
+    'level_4_1',
+    'level_3_4',
+    'level_3_4_1']
+
+# raw columns that mix numbers and text ("Above 95%", "s" for suppressed
+# results), read as text when only part of a dataset is downloaded
+DEMOGRAPHICS_TEXT = {"poverty": str, "poverty_1": str, "economic_need_index": str}
+TESTS_TEXT = {col: str for col in TEST_COLS if col != "number_tested"}
+
 SCHOOL_BASIC = [
  'dbn',
  'school_name',
@@ -52,23 +98,135 @@ DEMO_GROUPS = [
 ]
 
 
-def load_charter_math():
-    url = "https://data.cityofnewyork.us/resource/3xsw-bpuy.csv?$limit=10000000"
-    df = pd.read_csv(url)
-    return df
+def load_open_data(dataset_id, clean=None, schema_name="raw", store=None, source=None, dtype=None):
+    """
+    Loads a dataset from the NYC open data portal, using the local
+    snapshot in `store` when it is still fresh.
+    - dataset_id: the open data id of the dataset (e.g. nie4-bv6q)
+    - clean: optional function to clean the frame before it is cached
+    - schema_name: name of the cleaned shape of the frame, part of the cache key
+    - store: a snapshots.SnapshotStore, None for the default store
+             or False to always download
+    - source: read the raw data from a `sources` source (a local file,
+              a fixture frame...) instead, without the store. None uses
+              `sources.default_source()`
+    - dtype: dtypes for read_csv, see DEMOGRAPHICS_TEXT and TESTS_TEXT
+    """
+    if source is None:
+        source = sources.default_source()
+    if source is not None:
+        df = source.read(dataset_id)
+        return clean(df) if clean is not None else df
 
+    url = OPEN_DATA_URL.format(dataset_id)
+    if store is False:
+        df = pd.read_csv(url, dtype=dtype, low_memory=False)
+        return clean(df) if clean is not None else df
+
+    if store is None:
+        store = snapshots.default_store()
+    return store.load(dataset_id, url, clean=clean, schema=schema_name, dtype=dtype)
+
+
+@metrics.timed()
+def load_charter_math(store=None, source=None):
+    return load_open_data(CHARTER_MATH_ID, store=store, source=source)
 
 
-def load_demo_open_data():
-    demo_url = "https://data.cityofnewyork.us/resource/nie4-bv6q.csv?$limit=10000000"
-    df = pd.read_csv(demo_url)
-    return df
 
+def load_demo_open_data(store=None, source=None):
+    return load_open_data(DEMOGRAPHICS_ID, store=store, source=source)
 
-def load_demographics():
+
+def stream_open_data(dataset_id, path, clean=None, dtype=None, chunksize=CHUNK_SIZE,
+        paged=False, timeout=300):
+    """
+    Download a dataset from the NYC open data portal in chunks, cleaning
+    and saving each chunk to the directory `path` before reading the next,
+    so memory use depends on `chunksize` and not the size of the dataset.
+    Read the result with `ingest.read_chunks(path)`.
+    Return the number of rows saved.
+    - clean: function to clean each chunk
+    - dtype: dtypes for read_csv, see DEMOGRAPHICS_TEXT and TESTS_TEXT
+    - paged: request `chunksize` rows at a time with $offset instead of
+             streaming one big response
+    """
+    from . import ingest
+
+    if paged:
+        chunks = ingest.csv_pages(RESOURCE_URL.format(dataset_id), chunksize, timeout, dtype)
+    else:
+        chunks = ingest.csv_chunks(OPEN_DATA_URL.format(dataset_id), chunksize, timeout, dtype)
+    return ingest.write_chunks(chunks, path, clean)
+
+
+def stream_demographics(path, **kwargs):
+    """`stream_open_data` for the demographic data, with `clean_demographics`"""
+    return stream_open_data(DEMOGRAPHICS_ID, path, clean_demographics, DEMOGRAPHICS_TEXT, **kwargs)
+
+
+def stream_math_tests(path, **kwargs):
+    return stream_open_data(MATH_TESTS_ID, path, clean_test_data_categories, TESTS_TEXT, **kwargs)
+
+
+def stream_ela_tests(path, **kwargs):
+    return stream_open_data(ELA_TESTS_ID, path, clean_test_data_categories, TESTS_TEXT, **kwargs)
+
+
+@metrics.timed()
+def load_demographics(store=None, compact=False, source=None):
     """
     Loads the NYC school-level demographic data from the
-    open data portal and create a dataframe., ascending=False
+    open data portal and create a dataframe with `clean_demographics`.
+    - compact: use the smaller dtypes declared in `schema.DEMOGRAPHICS`
+    - store, source: see `load_open_data`
+    """
+    df = load_open_data(DEMOGRAPHICS_ID, clean=clean_demographics,
+        schema_name=DEMOGRAPHICS_SCHEMA, store=store, source=source, dtype=DEMOGRAPHICS_TEXT)
+    return schema.compact(df, schema.DEMOGRAPHICS) if compact else df
+
+
+@metrics.timed()
+def load_all(store=None, datasets=None, compact=False, workers=None, source=None):
+    """
+    Download (or read from the local snapshots), parse and clean the
+    open data sets at the same time in a pool of threads, so the wait
+    is the time of the slowest dataset and not the sum of all of them.
+    Return an `OpenData` bundle with a frame for each dataset (None for
+    the ones not asked for) and `timings`, the seconds each one took.
+    - datasets: names from LOADERS, default all of them
+    - compact: use the compact dtypes for demographics and tests
+    - workers: number of threads, default one per dataset
+    - source: where to read the raw data, see `load_open_data`
+    """
+    if datasets is None:
+        datasets = list(LOADERS)
+    unknown = set(datasets) - set(LOADERS)
+    if unknown:
+        raise ValueError(f"Unknown datasets {sorted(unknown)}, expected some of {list(LOADERS)}")
+
+    def timed(name):
+        start = time.perf_counter()
+        if name == "charter_math":
+            df = LOADERS[name](store=store, source=source)
+        else:
+            df = LOADERS[name](store=store, compact=compact, source=source)
+        return df, time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=workers or len(datasets)) as pool:
+        futures = {name: pool.submit(timed, name) for name in datasets}
+        results = {name: future.result() for name, future in futures.items()}
+
+    frames = {name: None for name in LOADERS}
+    frames.update({name: df for name, (df, _) in results.items()})
+    timings = {name: seconds for name, (_, seconds) in results.items()}
+    return OpenData(timings=timings, **frames)
+
+
+@metrics.timed()
+def clean_demographics(df):
+    """
+    Cleans the raw school-level demographic data.
     Adds new columns to the dataframe:
          short_name: the best guess at the nuload_ELAtestmerical name of the school (e.g. PS 9)
                      or "" if none exists
@@ -83,12 +241,6 @@ def load_demographics():
      black_hispanic: total number of black and hispanic students
     return the dataframe
     """
-    # load the school demo data from the open api server
-    df = load_demo_open_data()
-
-
-    boros = {"M":"Manhattan", "K": "Brooklyn", "X":"Bronx", "R":"Staten Island", "Q":"Queens"}
-
     # figure out what grades they teach
     df["pk"] = df["grade_3k_pk_half_day_full"] > 0
     df["elementary"] = df["grade_2"] > 0
@@ -96,18 +248,21 @@ def load_demographics():
     df["hs"] = df["grade_10"] > 0
 
     # parse data from dbn
-    df["year"] = df.year.apply(lambda year: int(year[:4]))
-    df["district"] = df.dbn.apply(lambda dbn: int(dbn[:2]))
-    df["school_num"] = df.dbn.apply(lambda dbn: int(dbn[3:]))
-    df["boro"] = df.dbn.apply(lambda dbn: dbn[2])
-    df["boro_name"] = df.boro.apply(lambda x: boros[x])
+    df["year"] = df.year.str[:4].astype(np.int64)
+    df["district"] = df.dbn.str[:2].astype(np.int64)
+    df["school_num"] = df.dbn.str[3:].astype(np.int64)
+    df["boro"] = df.dbn.str[2]
+    df["boro_name"] = df.boro.map(BOROS)
 
     # make it easier to look up schools
-    df["school_type"] = df.apply(school_type, axis=1)
+    df["school_type"] = school_types(df)
 
-    df["clean_name"] = df.apply(lambda row: clean_name(row.school_name), axis=1)
+    # names repeat every year and on every load, so only clean each one once
+    codes, names = pd.factorize(df.school_name)
+    clean, prefixes = normalize.NAMES.lookup(names)
+    df["clean_name"] = clean[codes]
 
-    df["short_name"] = df.apply(short_name, axis=1)
+    df["short_name"] = short_names(df, prefixes[codes])
 
     # add a few demo groups
     df["non_white"] = df.total_enrollment - df.white
@@ -125,14 +280,34 @@ def load_demographics():
     # list comprehension to get the columns that should be a %
     pct_cols = [col for col in df.columns if col.endswith("_1") and col != "grade_1"]
 
-    df = df.apply(lambda row: pct_to_float(row, pct_cols), axis=1)
-
     for col in pct_cols:
-        df[col] = pd.to_numeric(df[col])
+        df[col] = pcts_to_floats(df[col])
 
     return df
 
 
+def pcts_to_floats(series):
+    """
+    Vectorized version of `pct_to_float` for one column.
+    Values that are already numbers are kept, "Below 5%" becomes .04,
+    "Above 95%" becomes .96 and other strings ending in a % sign
+    are divided by 100.
+    """
+    if series.dtype != object:
+        return series
+
+    values = pd.to_numeric(series, errors="coerce")
+    text = series[values.isna() & series.notna()]
+    if len(text) == 0:
+        return values
+
+    parsed = text.str.extract(PCT_PATTERN)
+    pcts = pd.to_numeric(parsed.number, errors="coerce") / 100
+    pcts = np.select([parsed.below.notna(), parsed.above.notna()], [.04, .96], pcts)
+    values[text.index] = pcts
+    return values
+
+
 def pct_to_float(row, cols):
     """
     Cleans data that is expected to be a percentage expressed
@@ -174,25 +349,10 @@ def school_type(school):
     return "NA"
 
 
-def clean_name(sn):
-    sn = sn.lower()
-    sn = sn.strip()
-    sn = sn.replace(".", "")
-    clean = []
-    for word in sn.split(" "):
-        try:
-            n = int(word)
-            clean.append(str(n))
-        except:
-            clean.append(word)
-
-    sn = " ".join(clean)
-
-    p = re.compile(r"\b([m|p|i]s [0-9]*)")
-    m = p.search(sn)
-    if m:
-        sn = sn.replace(m.group(0), "")
-    return sn
+def school_types(df):
+    """`school_type` for every row of the schools DataFrame"""
+    types = np.select([df.middle, df.elementary, df.hs], ["MS", "PS", "HS"], "NA")
+    return pd.Series(types, index=df.index, dtype=object)
 
 
 def short_name(row):
@@ -210,27 +370,93 @@ def short_name(row):
 
 
 
+def short_names(df, prefixes=None):
+    """
+    `short_name` for every row of the schools DataFrame
+    - prefixes: the prefix found in each row's school_name, from `normalize.NAMES`
+    """
+    if prefixes is None:
+        codes, names = pd.factorize(df.school_name)
+        prefixes = normalize.NAMES.lookup(names)[1][codes]
+    prefix = pd.Series(prefixes, index=df.index, dtype=object).fillna(df.school_type.astype(str))
+    return prefix + " " + df.school_num.astype(str)
+
+
+@metrics.timed()
 def find_school(df, qry):
-    t = df.copy(deep=False)
-    latest = t.year.max()
+    """
+    Find a school in the schools DataFrame by its short name ("PS 9")
+    or by fuzzy matching the school name. Only the latest year is
+    searched, and fuzzy matches are sorted best first in a `match` column.
+    """
+    return search.school_index(df).find(df, qry)
 
-    # first lookup by number
-    t = t.query(f"short_name == '{qry.upper()}' and year=={latest}")
-    if len(t) > 0:
-        return t
 
-    # fuzzy search
-    t = df.copy(deep=False)
+@metrics.timed()
+def resolve_schools(df, names, year=None, top_k=1, n_jobs=None):
+    """
+    Match a list of school names from another dataset (a spreadsheet,
+    the charter school results...) to the schools in the DataFrame `df`.
+    Each name is found by its short name ("PS 9") or by fuzzy matching
+    like `find_school`, but the whole list is scored in one pass.
+    Returns a DataFrame with up to `top_k` rows for each name, best first:
+      input, rank, dbn, school_name, score (the `match` find_school gives
+      for the cleaned name, 100 for short names) and ambiguous (another
+      school scored as high as the best one). Names without a match,
+      and missing names, get one row with no dbn.
+    - year: the year of the schools to match, default the latest
+    - n_jobs: score the names in this many processes (-1 for one per core),
+              None to score them in this process
+    """
+    return search.school_index(df, year).resolve(df, names, top_k, n_jobs)
+
+
+@metrics.timed()
+def calc_changes(df, start, end, cols, fallback="nearest"):
+    """
+    The change in `cols` for each school between the `start` and `end`
+    years of the schools DataFrame `df`, e.g. 2015 -> 2019.
+    Returns a DataFrame with the index of the `end` year rows of `df`
+    and the columns dbn, start_year (the year the change is from) and
+    <col>_change for each of `cols`.
+    - fallback: what to do for schools that aren't in the `start` year
+      "nearest": use the year closest to `start` before `end`, the
+                 later one when two are as close
+      "zero": a change of 0, like the first version in changes.ipynb
+      None: leave the change empty (NaN)
+    """
+    if fallback not in ("nearest", "zero", None):
+        raise ValueError(f"Unknown fallback {fallback}, expected 'nearest', 'zero' or None")
+    if isinstance(cols, str):
+        cols = [cols]
 
-    t["match"] = t.clean_name.apply(lambda sn: fuzz.token_set_ratio(qry, sn))
-    t = t.query(f"match > 80 and year=={latest}")
-    t = pd.DataFrame(t)
-    # now sort the results based on the ratio match
-    t["match"] = t.clean_name.apply(lambda sn: fuzz.ratio(qry, sn))
-    t = t.sort_values(by=["match"], ascending=False)
+    values = df[["dbn", "year"] + cols].copy()
+    values["dbn"] = values.dbn.astype(str)
+    for col in cols:
+        values[col] = schema.to_number(values[col])
+
+    end_rows = values[values.year == end]
+    if fallback == "nearest":
+        start_rows = values[values.year < end]
+        # on a tie the year after `start` comes first, it isn't `earlier`
+        start_rows = start_rows.assign(distance=(start_rows.year - start).abs(),
+            earlier=start_rows.year < start)
+        start_rows = start_rows.sort_values(["dbn", "distance", "earlier"]).drop_duplicates("dbn")
+    else:
+        start_rows = values[values.year == start].drop_duplicates("dbn")
+    # the start row of each school, lined up with its end row
+    start_rows = start_rows.set_index("dbn").reindex(end_rows.dbn).set_index(end_rows.index)
+
+    changes = pd.DataFrame({"dbn": end_rows.dbn, "start_year": start_rows.year})
+    for col in cols:
+        change = end_rows[col] - start_rows[col]
+        if fallback == "zero":
+            change = change.fillna(0)
+        changes[col + "_change"] = change
+    return changes
 
-    return t
 
+@metrics.timed()
 def calc_districts(df):
     # calculate boro and district averages for each demo group
 
@@ -253,6 +479,11 @@ def calc_districts(df):
         "dbn": "count"
     }
 
+    # only sum the poverty counts, not the "Above 95%" markers, on a
+    # copy of just the summed columns so the whole frame isn't copied
+    if df.poverty.dtype == object:
+        df = df[["district", "year"] + list(demo_agg)].assign(poverty=schema.to_number(df.poverty))
+
     districts = df.groupby(["district", "year"]).agg(demo_agg).reset_index()
     districts = districts.rename(columns={"dbn":"num_schools"})
     del demo_agg["dbn"]
@@ -270,6 +501,99 @@ def calc_districts(df):
 
 
 
+def update_districts(districts, df, changed):
+    """
+    Update the output of `calc_districts` after rows were added to or
+    changed in the schools DataFrame `df`, only recalculating the
+    (district, year) groups that have rows in `changed`.
+    """
+    keys = ["district", "year"]
+    affected = pd.MultiIndex.from_frame(changed[keys].drop_duplicates())
+    in_affected = pd.MultiIndex.from_frame(df[keys]).isin(affected)
+    updated = calc_districts(df[in_affected])
+
+    unchanged = districts[~pd.MultiIndex.from_frame(districts[keys]).isin(affected)]
+    districts = pd.concat([unchanged, updated], ignore_index=True)
+    return districts.sort_values(by=keys, ignore_index=True)
+
+
+@metrics.timed()
+def ingest_demographics(store=None):
+    """
+    Add the school years that aren't in the local year-partitioned copy
+    of the demographic data yet, fetching and cleaning only those years,
+    and keep the district sums up to date the same way.
+    Return the (demographics, districts) DataFrames.
+    - store: the snapshots.SnapshotStore that holds the partitions,
+             None for the default store
+    """
+    from . import ingest
+
+    if store is None:
+        store = snapshots.default_store()
+    parts = ingest.partitions(store, DEMOGRAPHICS_ID, DEMOGRAPHICS_SCHEMA)
+
+    new = pd.DataFrame()
+    if not store.offline:
+        new = ingest.ingest(OPEN_DATA_URL.format(DEMOGRAPHICS_ID), parts,
+            clean=clean_demographics, timeout=store.timeout, dtype=DEMOGRAPHICS_TEXT)
+    df = parts.read()
+
+    districts = parts.read_table("districts")
+    if districts is None:
+        districts = calc_districts(df)
+        parts.write_table(districts, "districts")
+    elif len(new) > 0:
+        districts = update_districts(districts, df, new)
+        parts.write_table(districts, "districts")
+    return df, districts
+
+
+def ingest_test_data(dataset_id, store=None):
+    """
+    Add the years of test results (MATH_TESTS_ID or ELA_TESTS_ID) that
+    aren't in the local year-partitioned copy yet. Return all the years.
+    """
+    from . import ingest
+
+    if store is None:
+        store = snapshots.default_store()
+    parts = ingest.partitions(store, dataset_id, TESTS_SCHEMA)
+    if not store.offline:
+        ingest.ingest(OPEN_DATA_URL.format(dataset_id), parts,
+            clean=clean_test_data_categories, timeout=store.timeout, dtype=TESTS_TEXT)
+    return parts.read()
+
+
+def load_aggregates(store=None, source=None):
+    """
+    District, boro and citywide sums and percentages of the demographic
+    data for every year, as an `aggregates.Aggregates` for lookups:
+
+        aggs = load_aggregates()
+        aggs.district(13, 2018).black_pct
+        aggs.boro("K", 2018)
+        aggs.city()
+
+    They are calculated once per demographic snapshot and saved with it.
+    - store: a snapshots.SnapshotStore, None for the default store
+    - source: read the demographics from a `sources` source, see
+              `load_open_data`. Nothing is saved, the totals are
+              calculated each time
+    """
+    if source is None:
+        source = sources.default_source()
+    if source is not None:
+        df = load_demographics(source=source)
+        return aggregates.Aggregates(aggregates.rollup(df))
+
+    if store is None:
+        store = snapshots.default_store()
+    df = load_demographics(store=store)
+    return aggregates.materialize(df, store, DEMOGRAPHICS_ID, DEMOGRAPHICS_SCHEMA)
+
+
+@metrics.timed()
 def clean_test_data_categories(df):
     # normalize the categories that will become columns
     del df["school_name"]
@@ -305,172 +629,181 @@ def make_test_cols(test_df):
     return combos
 
 
-def load_math_tests():
+@metrics.timed()
+def load_math_tests(store=None, compact=False, source=None):
     """
     Loads the NYC Math test data from the
     open data portal and create a dataframe.
+    - compact: use the smaller dtypes declared in `schema.TESTS`,
+      suppressed results ("s") become missing values
     return the dataframe
     """
-    # load the school ELA test data from the open api server
-    MATH_url = "https://data.cityofnewyork.us/resource/m27t-ht3h.csv?$limit=10000000"
-    df = pd.read_csv(MATH_url)
-    df = clean_test_data_categories(df)
-
-    return df
+    df = load_open_data(MATH_TESTS_ID, clean=clean_test_data_categories,
+        schema_name=TESTS_SCHEMA, store=store, source=source, dtype=TESTS_TEXT)
+    return schema.compact(df, schema.TESTS) if compact else df
 
 
-def load_ela_tests():
+@metrics.timed()
+def load_ela_tests(store=None, compact=False, source=None):
     """
     Loads the NYC ELA test data from the
     open data portal and create a dataframe.
+    - compact: use the smaller dtypes declared in `schema.TESTS`
     """
-    # load the school ELA test data from the open api server
-    ELA_url = "https://data.cityofnewyork.us/resource/qkpp-pbi8.csv?$limit=10000000"
+    df = load_open_data(ELA_TESTS_ID, clean=clean_test_data_categories,
+        schema_name=TESTS_SCHEMA, store=store, source=source, dtype=TESTS_TEXT)
+    return schema.compact(df, schema.TESTS) if compact else df
 
-    df = pd.read_csv(ELA_url)
-    df = clean_test_data_categories(df)
 
-    return df
+# the datasets `load_all` knows about
+LOADERS = {
+    "demographics": load_demographics,
+    "math": load_math_tests,
+    "ela": load_ela_tests,
+    "charter_math": load_charter_math,
+}
+
+OpenData = namedtuple("OpenData", list(LOADERS) + ["timings"])
+
 
 def rows_to_cols(cat, grade, test_df, prefix="math"):
     """
         get the test result rows for one (category, grade)
         combination and make them columns in a new dataframe
     """
+    rows = test_df[(test_df.category == cat) & (test_df.grade == grade)]
+    temp_df = rows.drop(["grade", "category"], axis=1)
+    return temp_df.rename(columns=test_col_names(cat, grade, prefix))
+
 
-    # all of the cols that contain test-related data
-    test_cols = ['number_tested',
-        'mean_scale_score',
-        'level_1',
-        'level_1_1',
-        'level_2',
-        'level_2_1',
-        'level_3',
-        'level_3_1',
-        'level_4',
-        'level_4_1',
-        'level_3_4',
-        'level_3_4_1']
-    temp_df = test_df.query(f"category == '{cat}' and grade == '{grade}'")
-    new_cols = [f"{prefix}_{cat}_grade_{grade}_{col}" for col in test_cols]
-    rename = dict(zip(test_cols, new_cols))
-    temp_df = temp_df.rename(columns = rename)
-    temp_df = temp_df.drop(["grade", "category"], axis=1)
-    temp_df.set_index(["dbn", "year"])
-    return temp_df
+def test_col_names(cat, grade, prefix="math"):
+    """map the test result columns to their names in the wide dataframe"""
+    return {col: f"{prefix}_{cat}_grade_{grade}_{col}" for col in TEST_COLS}
 
+
+@metrics.timed()
 def combine_test_data(df, test_df, test_type="math"):
     """
     Combine test result data with the schools dataframe to make a wide
     data set where row data from test results (grade and demographic category)
     become columns in the new combined dataframe
     - df: the schools DataFrame
-    - test_df: the DataFrame with the test results
+    - test_df: the DataFrame with the test results, with one row for each
+      (dbn, year, category, grade)
     - test_type: either math or ela
     """
 
     # cat all combinations of test takers
     combos = make_test_cols(test_df)
 
-    # get an array of df for each combo
-    grade_cat_results = [rows_to_cols(cat, grade, test_df, test_type) for cat, grade in combos]
+    positions = test_positions(df, test_df, combos)
+    if positions is None:
+        # a school with two rows for a combination can't be reshaped,
+        # merging each combination keeps every row, as it always did
+        return merge_per_combination(df, test_df, combos, test_type)
 
+    names = [test_col_names(cat, grade, test_type) for cat, grade in combos]
+    wide = test_columns(test_df, positions, [[name[col] for name in names] for col in TEST_COLS])
+    wide = wide[[name[col] for name in names for col in TEST_COLS]]
 
-    # merge the category dataframes in with the school data
-    combined = df.copy()
-    for t in grade_cat_results:
-        combined = combined.merge(t,on=["dbn", "year"], how="left")
+    combined = df.reset_index(drop=True)
+    return pd.concat([combined, wide], axis=1)
+
+
+def test_positions(df, test_df, combos):
+    """
+    The row of `test_df` for each row of the schools DataFrame `df` and
+    each of the (category, grade) `combos`, -1 where there isn't one:
+    the rows a left merge of each combination would take.
+    None when a school has more than one row for a combination.
+    """
+    # number the schools and the combinations with ints, the combos
+    # are ordered as make_test_cols makes them: categories, then grades
+    dbn_codes, dbns = pd.factorize(test_df.dbn)
+    year_codes, years = pd.factorize(test_df.year)
+    school_codes, schools_tested = pd.factorize(dbn_codes * len(years) + year_codes)
+    cat_codes, cats = pd.factorize(test_df.category)
+    grade_codes, grades = pd.factorize(test_df.grade)
+    combo_codes = cat_codes * len(grades) + grade_codes
+
+    if len(pd.unique(school_codes * len(combos) + combo_codes)) < len(test_df):
+        return None
 
+    positions = np.full((len(schools_tested), len(combos)), -1, dtype=np.int64)
+    positions[school_codes, combo_codes] = np.arange(len(test_df))
+
+    df_dbns = pd.Index(dbns).get_indexer(df.dbn)
+    df_years = pd.Index(years).get_indexer(df.year)
+    school_rows = pd.Index(schools_tested).get_indexer(df_dbns * len(years) + df_years)
+    school_rows[(df_dbns < 0) | (df_years < 0)] = -1
+    return np.where(school_rows[:, None] >= 0, positions[school_rows], -1)
+
+
+def test_columns(test_df, positions, col_names):
+    """
+    A frame with the results in each of the TEST_COLS of `test_df` for
+    every school and combination in `positions`, named by `col_names`
+    (a list of names per test col). Each test col is taken for every
+    combination at once, and the text cols, most of the data, share one
+    block so they are never copied here. Missing results become NaN and
+    whole numbers stay ints for the combinations every school has, as
+    they do with a merge.
+    """
+    missing = positions < 0
+    complete = ~missing.any(axis=0)
+    n_combos = positions.shape[1]
+    text_cols = [col for col in TEST_COLS if test_df[col].dtype == object]
+    text = np.empty((len(positions), len(text_cols) * n_combos), dtype=object)
+    text_names = []
+    blocks = []
+    for col, names in zip(TEST_COLS, col_names):
+        values = test_df[col].array
+        names = np.array(names)
+        if col in text_cols:
+            block = text[:, len(text_names):len(text_names) + n_combos]
+            block[:] = values.to_numpy()[positions]
+            block[missing] = np.nan
+            text_names.extend(names)
+        elif isinstance(values.dtype, np.dtype) and values.dtype.kind in "iufb":
+            block = values.to_numpy()[positions]
+            if values.dtype.kind in "iub":
+                blocks.append(pd.DataFrame(block[:, complete], columns=names[complete]))
+                block = block[:, ~complete].astype(np.float64)
+                block[missing[:, ~complete]] = np.nan
+                names = names[~complete]
+            else:
+                block[missing] = np.nan
+            blocks.append(pd.DataFrame(block, columns=names))
+        else:
+            # extension types (the compact schema) fill with their own NA
+            blocks.append(pd.DataFrame({name: take(values, positions[:, i], allow_fill=True)
+                for i, name in enumerate(names)}))
+    return pd.concat([pd.DataFrame(text, columns=text_names)] + blocks, axis=1, copy=False)
+
+
+def merge_per_combination(df, test_df, combos, test_type="math"):
+    """
+    `combine_test_data` with one merge for each (category, grade), slower
+    but it works when a school has more than one row for a combination:
+    the school gets a row for each of them
+    """
+    combined = df.copy()
+    for cat, grade in combos:
+        combined = combined.merge(rows_to_cols(cat, grade, test_df, test_type), on=["dbn", "year"], how="left")
     return combined
 
-###################################################################################################
-
-def segregation_test(demo_df):
-    """
-    Here we perform the chi-square test to see the segregation of the
-    ethnic populations for each school...
-    Let us recall that we want to compare the distribution at the level
-    of district with the distribution at the level of school.
-    We have four cathegories asian, black, white and hispanic;
-    each school has its own observed frequencies f_obs and we are going to
-    compare with the expected frequencies f_exp from the distribution at the district level...
-    """
-
-    # The probabilities from the district level...
-    N_total    = demo_df.groupby(["district","year"]).agg('sum')
-    p_asian    = N_total["asian"]/N_total["total_enrollment"]
-    p_white    = N_total["white"]/N_total["total_enrollment"]
-    p_black    = N_total["black"]/N_total["total_enrollment"]
-    p_hispanic = N_total["hispanic"]/N_total["total_enrollment"]
-    p_multrace = N_total["multiple_race_categories"]/N_total["total_enrollment"]
-
-    # Data at the level of school...
-    N_school   = demo_df.groupby(["district","year","school_name"]).agg('sum')
-
-    y_data = []
-    d_data = []
-    school_name_data = []
-    chi2_pvalue_data = []
-    chi2_value_data  = []
-    KS_pvalue_data   = []
-    for i in range(0, len(demo_df)):
-        d = int(demo_df.loc[i,"district"])
-        d_data.append(d)
-        y = int(demo_df.loc[i,"year"])
-        y_data.append(y)
-        sch_name = demo_df.loc[i,"school_name"]
-        school_name_data.append(sch_name)
-        # This are the observed frequencies f_obs...by school in district "d" and for year "y"...
-        x_asian    = N_school.loc[(d,y,sch_name),"asian"]
-        x_white    = N_school.loc[(d,y,sch_name),"white"]
-        x_black    = N_school.loc[(d,y,sch_name),"black"]
-        x_hispanic = N_school.loc[(d,y,sch_name),"hispanic"]
-        x_multrace = N_school.loc[(d,y,sch_name),"multiple_race_categories"]
-        f_obs      = [x_asian, x_white, x_black, x_hispanic, x_multrace]
-        # This are the expected frequencies f_exp...by school in district "d" and for year "y"...
-        m_asian    = p_asian[(d,y)] * N_school.loc[(d,y,sch_name),"total_enrollment"]
-        m_white    = p_white[(d,y)] * N_school.loc[(d,y,sch_name),"total_enrollment"]
-        m_black    = p_black[(d,y)] * N_school.loc[(d,y,sch_name),"total_enrollment"]
-        m_hispanic = p_hispanic[(d,y)] * N_school.loc[(d,y,sch_name),"total_enrollment"]
-        m_multrace = p_multrace[(d,y)] * N_school.loc[(d,y,sch_name),"total_enrollment"]
-        f_exp      = [m_asian, m_white, m_black, m_hispanic, m_multrace]
-        # Chi_square statistic and p-value
-        chi2 = stats.chisquare(f_obs,f_exp)
-        chi2_value_data.append(chi2[0])
-        chi2_pvalue_data.append(chi2[1])
-        # Let us note that we can also compute also the KS test as follows from the above data
-        sample1 = np.concatenate((np.ones(int(round(m_asian))), 2*np.ones(int(round(m_white))), 3*np.ones(int(round(m_black))),
-                             4*np.ones(int(round(m_hispanic))), 5*np.ones(int(round(m_multrace)))))
-        sample2 = np.concatenate((np.ones(int(x_asian)), 2*np.ones(int(x_white)), 3*np.ones(int(x_black)),
-                             4*np.ones(int(x_hispanic)), 5*np.ones(int(x_multrace))))
-        list1 = sample1.tolist()
-        list2 = sample2.tolist()
-        if (len(list1)==len(list2)):
-            KS_pvalue = ks_disc_2sample( list1, list2 )
-            KS_pvalue_data.append( KS_pvalue )
-        elif (len(list1) > len(list2)):
-            random_item_from_list = random.choice(list1)
-            list1.remove(random_item_from_list)
-            KS_pvalue = ks_disc_2sample( list1, list2 )
-            KS_pvalue_data.append( KS_pvalue )
-        elif (len(list1) < len(list2)):
-            random_item_from_list = random. choice(list2)
-            list2.remove(random_item_from_list)
-            KS_pvalue = ks_disc_2sample( list1, list2 )
-            KS_pvalue_data.append( KS_pvalue )
-
-    # Since the script spent some time until finish, it is better to have the data in a .csv file
-    # Below we construct that file...
-    header_csv = " p_value_chi2test, chi2_value_chi2test, p_value_KStest      "
-    Dls_modif_to_dat = np.column_stack( ( chi2_pvalue_data, chi2_value_data, KS_pvalue_data ) )
-    np.savetxt( 'segregation_tests.csv',
-	    Dls_modif_to_dat, delimiter=',', header= header_csv, fmt=['%18.12E','%18.12E','%18.12E'] )
-
-
-    return (chi2_pvalue_data, chi2_value_data, KS_pvalue_data)
-
-
-
-#demo_df["p_value_chi2test"]    = chi2_pvalue_data
-#demo_df["chi2_value_chi2test"] = chi2_value_data
-#demo_df["p_value_KStest"]      = KS_pvalue_data
+
+# functions of the heavier modules, imported the first time they are used
+LAZY = {
+    "segregation_test": "stats",
+    "save_results": "stats",
+}
+LAZY_MODULES = ["ingest", "segregation", "stats"]
+
+
+def __getattr__(name):
+    if name in LAZY:
+        return getattr(importlib.import_module("." + LAZY[name], __package__), name)
+    if name in LAZY_MODULES:
+        return importlib.import_module("." + name, __package__)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,332 @@
+"""
+A search index over the school names in the demographics DataFrame.
+
+`find_school` used to score every `clean_name` in every year with fuzzy
+matching before throwing away all but the latest year. A `SchoolIndex`
+is built once per DataFrame and only ever looks at the latest year:
+
+- short names ("PS 9") are a dict lookup
+- every distinct latest-year name is split into tokens, with an
+  inverted index from token to names, and a count of its characters
+- a query is only scored against the names that share a token with it,
+  or whose character counts leave room for a token_set_ratio above the
+  cutoff, so the results are the same as scoring every name
+
+`SchoolIndex.resolve` matches a whole list of names from another
+dataset at once: each distinct name is cleaned and scored once, and
+the character counts of a batch of names are compared to every school
+name in one array operation, optionally in several processes.
+
+`school_index` rebuilds an index when the frame's year, short_name or
+clean_name column is replaced. Names changed in place aren't noticed,
+call `forget(df)` after editing them.
+
+People ask about the same few schools over and over, so a `QueryCache`
+keeps the most recent answers, keyed by the normalized query and the
+version of the data they were found in.
+"""
+import functools
+import threading
+import weakref
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+from fuzzywuzzy import fuzz, utils
+
+from .normalize import clean_name, normalize_query
+
+# the characters left by fuzzywuzzy's full_process, plus the space
+ALPHABET = "abcdefghijklmnopqrstuvwxyz0123456789_ "
+CHAR_CODES = {c: i for i, c in enumerate(ALPHABET)}
+
+# fuzzy matches have to score above this to be returned
+MIN_MATCH = 80
+
+# queries whose character counts are compared to every name at once
+BATCH_SIZE = 64
+
+# names and queries whose tokens are remembered
+TOKEN_CACHE_SIZE = 65536
+
+
+@functools.lru_cache(maxsize=TOKEN_CACHE_SIZE)
+def tokens(name):
+    """
+    The set of tokens fuzz.token_set_ratio compares for `name`,
+    remembered since the same names are indexed on every reload
+    """
+    return frozenset(utils.full_process(name, force_ascii=True).split())
+
+
+def char_counts(toks):
+    """
+    Count the characters of the string token_set_ratio builds
+    from `toks` (the sorted tokens joined with spaces).
+    """
+    counts = np.zeros(len(ALPHABET), dtype=np.int32)
+    for tok in toks:
+        for c in tok:
+            counts[CHAR_CODES[c]] += 1
+    counts[CHAR_CODES[" "]] = max(len(toks) - 1, 0)
+    return counts
+
+
+class NameMatcher:
+    def __init__(self, names):
+        """
+        The inverted index and character counts of the distinct clean
+        `names`, small enough to send to worker processes.
+        """
+        self.names = names
+        self.postings = {}
+        self.counts = np.zeros((len(names), len(ALPHABET)), dtype=np.int32)
+        for i, name in enumerate(names):
+            toks = tokens(name)
+            for tok in toks:
+                self.postings.setdefault(tok, []).append(i)
+            self.counts[i] = char_counts(toks)
+        self.lengths = self.counts.sum(axis=1)
+
+    def close(self, q):
+        """
+        The ids of the names whose character counts leave room for a
+        token_set_ratio above MIN_MATCH with each row of query counts `q`.
+        When the query and a name share no tokens, token_set_ratio is the
+        ratio of their sorted tokens, and a ratio can't be higher than
+        the share of characters the two strings have in common.
+        """
+        common = np.minimum(self.counts[None, :, :], q[:, None, :]).sum(axis=2)
+        best = 200 * common / (self.lengths[None, :] + q.sum(axis=1)[:, None])
+        return [np.flatnonzero(row & (self.lengths > 0)) for row in best > MIN_MATCH]
+
+    def candidates(self, qry, close=None):
+        """the ids of the names that could score above MIN_MATCH with fuzz.token_set_ratio"""
+        toks = tokens(qry)
+        if not toks:
+            return np.array([], dtype=np.intp)
+        if close is None:
+            close = self.close(char_counts(toks)[None, :])[0]
+        shared = [np.array(self.postings.get(tok, []), dtype=np.intp) for tok in toks]
+        return np.unique(np.concatenate([close] + shared))
+
+    def scores(self, queries):
+        """
+        For each of `queries`, a list of (name id, token_set_ratio, ratio)
+        of the names that score above MIN_MATCH. The character counts of
+        the queries are compared to the names BATCH_SIZE queries at a time.
+        """
+        results = []
+        for start in range(0, len(queries), BATCH_SIZE):
+            batch = queries[start:start + BATCH_SIZE]
+            counts = np.array([char_counts(tokens(qry)) for qry in batch]).reshape(-1, len(ALPHABET))
+            for qry, close in zip(batch, self.close(counts)):
+                found = []
+                for i in self.candidates(qry, close):
+                    score = fuzz.token_set_ratio(qry, self.names[i])
+                    if score > MIN_MATCH:
+                        found.append((i, score, fuzz.ratio(qry, self.names[i])))
+                results.append(found)
+        return results
+
+
+# the columns a SchoolIndex is built from
+INDEXED_COLUMNS = ["year", "short_name", "clean_name"]
+
+
+def column_buffers(df):
+    """the arrays that hold the values of the indexed columns of `df`"""
+    buffers = []
+    for col in INDEXED_COLUMNS:
+        values = df[col].array
+        # the codes of a categorical, which change with its values
+        buffers.append(values.codes if isinstance(values, pd.Categorical) else np.asarray(values))
+    return buffers
+
+
+def address(values):
+    return values.__array_interface__["data"][0], values.shape
+
+
+class SchoolIndex:
+    def __init__(self, df, year=None):
+        """
+        Build the search index for the schools DataFrame `df`,
+        which needs the year, short_name and clean_name columns.
+        - year: the year to search, default the latest
+        """
+        self.frame = weakref.ref(df)
+        self.rows = len(df)
+        self.buffers = column_buffers(df)
+        self.latest = df.year.max() if year is None else year
+
+        # positions of the latest year's rows in df
+        self.positions = np.flatnonzero((df.year == self.latest).to_numpy())
+        latest = df.iloc[self.positions]
+
+        self.short_names = {}
+        for sn, pos in zip(latest.short_name, self.positions):
+            self.short_names.setdefault(sn, []).append(pos)
+
+        # every distinct name, and the name of each latest row
+        self.codes, self.names = pd.factorize(latest.clean_name)
+        self.matcher = NameMatcher(self.names)
+
+    def is_current(self, df):
+        """
+        True when `df` is the frame the index was built from and its
+        indexed columns haven't been replaced. Values changed in place
+        (df.loc[...] = ...) aren't noticed, call `forget(df)` after that.
+        """
+        if self.frame() is not df or self.rows != len(df):
+            return False
+        # the old arrays are kept alive, so their memory can't be reused
+        # by a new column and a different address means a new column
+        return all(address(old) == address(new) for old, new in zip(self.buffers, column_buffers(df)))
+
+    def candidates(self, qry):
+        """
+        Return the ids of the names that could score above MIN_MATCH
+        with fuzz.token_set_ratio.
+        """
+        return self.matcher.candidates(qry)
+
+    def find(self, df, qry):
+        """
+        Search for a school by short name ("PS 9") or by fuzzy matching
+        its name. Fuzzy matches come back sorted by how close they are,
+        in the same order as scoring the whole DataFrame would give.
+        """
+        positions = self.short_names.get(qry.upper())
+        if positions is not None:
+            return df.iloc[positions]
+
+        names = self.names[self.candidates(qry)]
+        matches = [name for name in names if fuzz.token_set_ratio(qry, name) > MIN_MATCH]
+
+        keep = np.isin(self.codes, self.names.get_indexer(matches))
+        t = df.iloc[self.positions[keep]].copy()
+
+        # now sort the results based on the ratio match
+        ratios = {name: fuzz.ratio(qry, name) for name in matches}
+        t["match"] = t.clean_name.astype(object).apply(ratios.get)
+        t = t.sort_values(by=["match"], ascending=False)
+        return t
+
+    def resolve(self, df, names, top_k=1, n_jobs=None):
+        """
+        Match each of the school `names` from another list to the `top_k`
+        schools of the indexed year, see `resolve_schools`.
+        """
+        inputs = pd.Series(list(names), dtype=object)
+        # missing names (NaN, None) get a row without a match
+        present = inputs.notna()
+        short = inputs[present].astype(str).map(lambda name: normalize_query(name).upper())
+        queries = inputs[present].astype(str).map(clean_name)
+
+        # score each distinct query once
+        fuzzy = pd.unique(queries[~short.isin(list(self.short_names))])
+        if n_jobs is None or len(fuzzy) < 2:
+            scores = self.matcher.scores(fuzzy)
+        else:
+            from joblib import Parallel, delayed, effective_n_jobs
+
+            chunks = [chunk for chunk in np.array_split(fuzzy, effective_n_jobs(n_jobs)) if len(chunk)]
+            parts = Parallel(n_jobs=n_jobs)(delayed(self.matcher.scores)(chunk) for chunk in chunks)
+            scores = [found for part in parts for found in part]
+        scores = dict(zip(fuzzy, scores))
+
+        # the rows of each name in the indexed year
+        rows = {}
+        for code, pos in zip(self.codes, self.positions):
+            rows.setdefault(code, []).append(pos)
+
+        dbns = df.dbn.to_numpy()
+        school_names = df.school_name.to_numpy()
+        records = []
+        for name, sn, qry in zip(inputs, short.reindex(inputs.index), queries.reindex(inputs.index)):
+            if pd.isna(qry):
+                matches = []
+            elif sn in self.short_names:
+                matches = [(pos, 100) for pos in self.short_names[sn]]
+            else:
+                # fuzz.ratio with the cleaned name, the `match` that
+                # find_school gives when it is asked for clean_name(name)
+                matches = [(pos, ratio) for i, _, ratio in scores[qry] for pos in rows[i]]
+            matches.sort(key=lambda m: (-m[1], dbns[m[0]]))
+            if not matches:
+                records.append((name, None, None, None, None, False))
+                continue
+            ambiguous = len(matches) > 1 and matches[1][1] == matches[0][1]
+            for rank, (pos, score) in enumerate(matches[:top_k], 1):
+                records.append((name, rank, dbns[pos], school_names[pos], score, ambiguous))
+
+        results = pd.DataFrame.from_records(records,
+            columns=["input", "rank", "dbn", "school_name", "score", "ambiguous"])
+        return results.astype({"rank": "Int64", "score": "Int64"})
+
+
+_indexes = {}
+
+
+def school_index(df, year=None):
+    """
+    The SchoolIndex for `df` and `year` (default the latest),
+    built the first time they are searched
+    """
+    indexes = _indexes.get(id(df))
+    index = indexes.get(year) if indexes is not None else None
+    if index is not None and index.is_current(df):
+        return index
+
+    index = SchoolIndex(df, year)
+    if indexes is None:
+        weakref.finalize(df, _indexes.pop, id(df), None)
+        _indexes[id(df)] = {}
+    _indexes[id(df)][year] = index
+    return index
+
+
+def forget(df):
+    """drop the indexes built for `df`, after changing its names in place"""
+    _indexes.pop(id(df), None)
+
+
+class QueryCache:
+    def __init__(self, maxsize=256):
+        """
+        A thread safe least recently used cache of search results.
+        - maxsize: number of results to keep
+        """
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """the value saved for `key`, or None"""
+        with self.lock:
+            value = self.entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        """forget every result, when the data they came from is replaced"""
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self.entries)}
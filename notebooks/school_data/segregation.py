@@ -0,0 +1,217 @@
+"""
+Chi-square and discrete Kolmogorov-Smirnov tests of how far the racial
+makeup of each school is from the makeup of its district.
+
+The tests work on counts of students per race category, with one row per
+school, so every school in every year is tested at once with NumPy:
+
+- expected counts come from one groupby-transform over (district, year)
+- the chi-square statistics are one matrix expression
+- the KS statistic is read off the cumulative counts, either as the
+  largest gap between the two CDFs or as the value ksdisc.ks_disc_2sample
+  gets by walking both sorted samples
+- the KS p-value is a permutation test like ks_disc_2sample's: shuffling
+  the pooled students between the two samples draws the counts of the
+  first sample from a multivariate hypergeometric distribution
+
+Each district only needs its own rows, so `partitioned_stats` can split
+the work across processes with joblib.
+"""
+import numpy as np
+from joblib import Parallel, delayed
+from scipy import stats
+
+# the race categories, in the order the tests compare them
+RACES = ["asian", "white", "black", "hispanic", "multiple_race_categories"]
+
+# number of permutations for the KS p-values, as in ks_disc_2sample
+KS_ITERS = 1000
+
+# schools whose permutations are drawn together, to bound memory use
+KS_BATCH = 256
+
+
+def observed_expected(demo_df):
+    """
+    Return the observed and expected counts of students in each race
+    category for every row of `demo_df`, as two (rows x RACES) arrays.
+    Schools are summed by (district, year, school_name) and the expected
+    counts use the district's share of each race in that year.
+    """
+    cols = RACES + ["total_enrollment"]
+    school = demo_df.groupby(["district", "year", "school_name"], observed=True)[cols].transform("sum")
+    district = demo_df.groupby(["district", "year"], observed=True)[cols].transform("sum")
+
+    observed = school[RACES].to_numpy(dtype=float)
+    p = district[RACES].to_numpy(dtype=float) / district[["total_enrollment"]].to_numpy(dtype=float)
+    expected = p * school[["total_enrollment"]].to_numpy(dtype=float)
+    return observed, expected
+
+
+def chi_square(observed, expected):
+    """the chi-square statistic and p-value of each row, like stats.chisquare"""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        chi2 = ((observed - expected) ** 2 / expected).sum(axis=1)
+    return chi2, stats.chi2.sf(chi2, observed.shape[1] - 1)
+
+
+def ks_statistic(a, b):
+    """
+    The two-sample KS statistic for samples given as counts per category,
+    `a` and `b` of shape (..., categories): the largest gap between the
+    two empirical CDFs, which for discrete data only change between
+    categories. The samples can have different sizes.
+    """
+    A = np.cumsum(a, axis=-1)
+    B = np.cumsum(b, axis=-1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        gaps = A / A[..., -1:] - B / B[..., -1:]
+    return np.abs(gaps).max(axis=-1)
+
+
+def ksdisc_statistic(a, b):
+    """
+    The KS statistic as ksdisc.ks_disc_2sample computes it, for counts
+    per category like `ks_statistic`.
+    ksdisc walks both sorted samples and steps through tied values one
+    pair at a time, so when the samples have different sizes the largest
+    gap can be part way through a category, after the paired steps.
+    For samples of the same size it is the same as `ks_statistic`.
+    """
+    n1 = a.sum(axis=-1, keepdims=True)
+    n2 = b.sum(axis=-1, keepdims=True)
+    A = np.cumsum(a, axis=-1)
+    B = np.cumsum(b, axis=-1)
+    paired = np.minimum(a, b)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        end = A / n1 - B / n2
+        mid = (A - a + paired) / n1 - (B - b + paired) / n2
+    return np.maximum(np.abs(end), np.abs(mid)).max(axis=-1)
+
+
+def permutation_counts(pooled, n1, iters, rng):
+    """
+    Draw `iters` random splits of the `pooled` counts (rows x categories),
+    returning the counts that land in a first sample of size `n1`,
+    shape (rows, iters, categories).
+    """
+    rows, k = pooled.shape
+    draws = np.zeros((rows, iters, k), dtype=np.int64)
+    left = np.repeat(pooled.sum(axis=1, keepdims=True), iters, axis=1)
+    wanted = np.repeat(n1[:, None], iters, axis=1)
+    for i in range(k - 1):
+        good = np.repeat(pooled[:, i:i + 1], iters, axis=1)
+        left = left - good
+        draws[:, :, i] = rng.hypergeometric(good, left, wanted)
+        wanted = wanted - draws[:, :, i]
+    draws[:, :, k - 1] = wanted
+    return draws
+
+
+def ks_pvalues(a, b, iters=KS_ITERS, seed=None, statistic=ks_statistic):
+    """
+    Permutation p-values of the discrete KS test for each row of the
+    count arrays `a` and `b`: the share of random splits of the pooled
+    students whose statistic is larger than the observed one.
+    The samples can have different sizes. Rows where either sample
+    is empty get NaN.
+    - seed: an int or numpy Generator for the permutations
+    - statistic: `ks_statistic` or `ksdisc_statistic`
+    """
+    rng = np.random.default_rng(seed)
+    a = np.asarray(a, dtype=np.int64)
+    b = np.asarray(b, dtype=np.int64)
+    pvalues = np.full(len(a), np.nan)
+
+    valid = np.flatnonzero((a.sum(axis=1) > 0) & (b.sum(axis=1) > 0))
+    for start in range(0, len(valid), KS_BATCH):
+        rows = valid[start:start + KS_BATCH]
+        observed = statistic(a[rows], b[rows])
+        pooled = a[rows] + b[rows]
+        first = permutation_counts(pooled, a[rows].sum(axis=1), iters, rng)
+        permuted = statistic(first, pooled[:, None, :] - first)
+
+        # statistics that are equal in exact arithmetic may differ in
+        # the last bit, only count the clearly larger ones
+        larger = permuted > observed[:, None] + 1e-10
+        pvalues[rows] = larger.sum(axis=1) / iters
+    return pvalues
+
+
+def drop_one(a, b, rng):
+    """
+    Make each pair of samples the same size by removing one student at
+    random from the larger one, as the original segregation_test did.
+    Samples that differ by more than one student stay unequal.
+    """
+    a = a.copy()
+    b = b.copy()
+    diff = a.sum(axis=1) - b.sum(axis=1)
+    for counts, rows in [(a, np.flatnonzero(diff > 0)), (b, np.flatnonzero(diff < 0))]:
+        # pick the category of a random student
+        c = counts[rows]
+        u = rng.random(len(rows)) * c.sum(axis=1)
+        i = (np.cumsum(c, axis=1) <= u[:, None]).sum(axis=1)
+        counts[rows, i] -= 1
+    return a, b
+
+
+def segregation_stats(demo_df, iters=KS_ITERS, ks="legacy", seed=None):
+    """
+    Run the chi-square and KS tests for every row of `demo_df`.
+    Return the arrays (chi2_pvalue, chi2_value, KS_pvalue).
+    - iters: number of permutations for each KS p-value
+    - ks: "legacy" does what the original row-by-row test did: it removes
+          one random student from the larger sample and uses ksdisc's
+          statistic. "exact" compares the rounded expected counts with
+          the observed counts as they are
+    - seed: an int or numpy Generator for the random permutations (and
+            the removed students), the same seed gives the same p-values
+    """
+    if ks not in ("exact", "legacy"):
+        raise ValueError(f"Unknown KS mode {ks}, expected 'exact' or 'legacy'")
+
+    rng = np.random.default_rng(seed)
+    observed, expected = observed_expected(demo_df)
+    chi2, chi2_pvalue = chi_square(observed, expected)
+
+    # the KS test compares whole students, rounding the expected counts
+    sample1 = np.rint(np.nan_to_num(expected)).astype(np.int64)
+    sample2 = observed.astype(np.int64)
+    if ks == "legacy":
+        sample1, sample2 = drop_one(sample1, sample2, rng)
+        ks_pvalue = ks_pvalues(sample1, sample2, iters, rng, statistic=ksdisc_statistic)
+    else:
+        ks_pvalue = ks_pvalues(sample1, sample2, iters, rng)
+    return chi2_pvalue, chi2, ks_pvalue
+
+
+def partitioned_stats(demo_df, n_jobs=-1, iters=KS_ITERS, ks="legacy", seed=None):
+    """
+    `segregation_stats` run on the schools of each district (every year
+    of it) in a pool of `n_jobs` processes (-1 for one per core), with
+    the results put back in the order of the rows of `demo_df`.
+    Each district gets its own random stream spawned from `seed`, so
+    the same seed gives the same p-values for any number of processes
+    (but not the same ones as `segregation_stats`).
+    """
+    if ks not in ("exact", "legacy"):
+        raise ValueError(f"Unknown KS mode {ks}, expected 'exact' or 'legacy'")
+
+    # only send the columns the tests use to the workers
+    data = demo_df[["district", "year", "school_name"] + RACES + ["total_enrollment"]]
+    # the tests only compare schools with their own district and year,
+    # so a district is the unit of work, big enough to be worth a task
+    partitions = list(data.groupby("district", observed=True).indices.values())
+    seeds = np.random.SeedSequence(seed).spawn(len(partitions))
+
+    results = Parallel(n_jobs=n_jobs)(
+        delayed(segregation_stats)(data.iloc[rows], iters, ks, np.random.default_rng(s))
+        for rows, s in zip(partitions, seeds))
+
+    merged = tuple(np.full(len(data), np.nan) for _ in range(3))
+    for rows, result in zip(partitions, results):
+        for out, values in zip(merged, result):
+            out[rows] = values
+    return merged
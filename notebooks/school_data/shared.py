@@ -0,0 +1,180 @@
+"""
+Cleaned frames shared between the processes on one machine.
+
+The skill, each notebook and each test run used to download and clean
+their own copy of the data. A `SharedFrame` publishes a cleaned frame
+as an uncompressed Arrow IPC (Feather v2) file that other processes
+memory-map instead of reading: the operating system keeps one copy of
+the file in its page cache for all of them, and opening it takes
+milliseconds whatever its size.
+
+    frame = demographics()
+    frame.publish(schools.load_demographics(compact=True))   # one process
+    version, df = frame.read()                                # the others
+
+Each `publish` writes a new file, `<name>.<version>.arrow`, and then
+swaps in a small manifest naming it with an atomic rename, so a reader
+sees either the old version or the new one. Readers check `version()`
+(or call `poll`) to pick up new versions. Old files are removed after
+KEEP_VERSIONS newer ones; on Linux and macOS a process that still has
+one mapped keeps reading it until it lets go.
+
+A frame is published with the schema it was made with, a name and a
+fingerprint of its dtypes (`schema_key`). A reader made for another
+schema, an older version of the code say, gets a ValueError instead
+of a frame it doesn't expect.
+
+`table()` is zero-copy. `read()` converts to pandas: numeric columns
+without missing values share the mapped memory, categorical, text and
+nullable columns are copied into the reading process.
+"""
+import glob
+import hashlib
+import json
+import os
+import time
+
+import pyarrow as pa
+
+from . import snapshots
+
+# old versions kept on disk for readers that haven't moved on yet
+KEEP_VERSIONS = 2
+
+# the name the skill publishes the compact demographics under
+DEMOGRAPHICS = "demographics"
+
+
+def default_path():
+    """the directory for shared frames, next to the default snapshot store"""
+    return os.path.join(snapshots.default_store().path, "shared")
+
+
+def schema_key(name, dtypes):
+    """
+    `name` (like schools.DEMOGRAPHICS_SCHEMA) and a fingerprint of the
+    dict of column to dtype `dtypes` (like schema.DEMOGRAPHICS), which
+    changes whenever a column or its dtype does
+    """
+    text = json.dumps({col: str(dtype) for col, dtype in dtypes.items()}, sort_keys=True)
+    return f"{name}-{hashlib.sha1(text.encode()).hexdigest()[:12]}"
+
+
+def demographics(path=None):
+    """the SharedFrame of the compact demographics, as the skill publishes them"""
+    from . import schema, schools
+
+    return SharedFrame(path or default_path(), DEMOGRAPHICS,
+        schema=schema_key(schools.DEMOGRAPHICS_SCHEMA, schema.DEMOGRAPHICS))
+
+
+class SharedFrame:
+    def __init__(self, path, name, schema=None):
+        """
+        - path: directory that holds the shared files
+        - name: what the frame is called, e.g. "demographics"
+        - schema: the `schema_key` of the frames this process publishes
+                  and reads, None to accept any
+        """
+        self.path = os.path.expanduser(path)
+        self.name = name
+        self.schema = schema
+        # the version returned by the last read or poll in this process
+        self.seen = 0
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.path, f"{self.name}.json")
+
+    def data_path(self, version):
+        return os.path.join(self.path, f"{self.name}.{version}.arrow")
+
+    def manifest(self):
+        return snapshots.read_json(self.manifest_path)
+
+    def version(self):
+        """the latest published version, 0 when nothing has been published"""
+        manifest = self.manifest()
+        return manifest["version"] if manifest else 0
+
+    def publish(self, df, source=None):
+        """
+        Make `df` the latest version of the frame for every process
+        and return its version number. Only one process should publish
+        a frame at a time.
+        - source: what `df` was made from, like `SnapshotStore.version`.
+                  When it is the source of the latest version, nothing
+                  is written and that version is returned
+        """
+        manifest = self.manifest()
+        if source is not None and manifest is not None and manifest.get("source") == source \
+                and manifest.get("schema") == self.schema:
+            return manifest["version"]
+
+        os.makedirs(self.path, exist_ok=True)
+        version = manifest["version"] + 1 if manifest else 1
+        table = pa.Table.from_pandas(df, preserve_index=True)
+
+        path = self.data_path(version)
+        tmp = path + ".tmp"
+        with pa.OSFile(tmp, "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(tmp, path)
+
+        snapshots.write_json({"name": self.name, "version": version, "rows": len(df),
+            "file": os.path.basename(path), "source": source, "schema": self.schema,
+            "published_at": time.time()},
+            self.manifest_path)
+        self.remove_old(version)
+        return version
+
+    def remove_old(self, version):
+        for path in glob.glob(os.path.join(self.path, f"{self.name}.*.arrow")):
+            old = os.path.basename(path)[len(self.name) + 1:-len(".arrow")]
+            if old.isdigit() and int(old) <= version - KEEP_VERSIONS:
+                try:
+                    os.remove(path)
+                except OSError:
+                    # still open in a process on a system that won't delete it
+                    pass
+
+    def table(self):
+        """
+        The latest version as (version, pyarrow.Table), memory-mapped
+        from the file without reading it. Raises FileNotFoundError when
+        nothing has been published, and ValueError when it was published
+        with another schema.
+        """
+        for attempt in range(2):
+            manifest = self.manifest()
+            if manifest is None:
+                raise FileNotFoundError(f"No shared {self.name} in {self.path}")
+            if self.schema is not None and manifest.get("schema") != self.schema:
+                raise ValueError(f"The shared {self.name} has schema {manifest.get('schema')}, "
+                    f"expected {self.schema}")
+            try:
+                source = pa.memory_map(os.path.join(self.path, manifest["file"]))
+                break
+            except FileNotFoundError:
+                # removed by a publisher after we read the manifest, read the new one
+                if attempt:
+                    raise
+        table = pa.ipc.open_file(source).read_all()
+        self.seen = manifest["version"]
+        return manifest["version"], table
+
+    def read(self):
+        """
+        The latest version as (version, DataFrame). Only numeric columns
+        without missing values share the mapped memory, use `table()`
+        to read the rest without copying it.
+        """
+        version, table = self.table()
+        return version, snapshots.restore_nan(table.to_pandas(split_blocks=True))
+
+    def poll(self):
+        """(version, DataFrame) when a newer version was published since the last read or table, else None"""
+        if self.version() <= self.seen:
+            return None
+        return self.read()
@@ -0,0 +1,215 @@
+"""
+Local snapshots of the NYC open data sets.
+
+Every loader in `schools.py` used to download the full CSV from the open
+data portal each time it was called. A `SnapshotStore` keeps a Parquet copy
+of each dataset on disk, keyed by the dataset id and the schema of the
+(cleaned) frame that was saved, next to a small JSON file with the HTTP
+validators (ETag / Last-Modified) from the last download.
+
+    store = SnapshotStore("~/.cache/school_data", ttl=24 * 60 * 60)
+    df = store.load("nie4-bv6q", url, clean=clean_demographics, schema="demographics-1")
+
+- a snapshot younger than `ttl` seconds is read straight from disk
+- an older one is revalidated with a conditional GET; a 304 reply
+  reuses the local copy, a 200 reply is parsed, cleaned and saved
+- in `offline` mode the network is never used
+
+The default store lives in `~/.cache/school_data` and can be configured
+with the `SCHOOL_DATA_CACHE`, `SCHOOL_DATA_TTL` and `SCHOOL_DATA_OFFLINE`
+environment variables.
+"""
+import io
+import json
+import os
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from . import metrics
+
+DEFAULT_CACHE_DIR = os.path.join("~", ".cache", "school_data")
+DEFAULT_TTL = 24 * 60 * 60
+
+
+class SnapshotStore:
+    def __init__(self, path=DEFAULT_CACHE_DIR, ttl=DEFAULT_TTL, offline=False, timeout=300):
+        """
+        - path: directory that holds the snapshot files
+        - ttl: seconds a snapshot is trusted before it is revalidated
+        - offline: never touch the network, only serve local snapshots
+        - timeout: seconds to wait for the open data server
+        """
+        self.path = os.path.expanduser(path)
+        self.ttl = ttl
+        self.offline = offline
+        self.timeout = timeout
+
+    def key(self, dataset_id, schema="raw"):
+        return f"{dataset_id}.{schema}"
+
+    def data_path(self, dataset_id, schema="raw"):
+        return os.path.join(self.path, self.key(dataset_id, schema) + ".parquet")
+
+    def meta_path(self, dataset_id, schema="raw"):
+        return os.path.join(self.path, self.key(dataset_id, schema) + ".json")
+
+    def meta(self, dataset_id, schema="raw"):
+        """return the metadata for a saved snapshot or None if there isn't one"""
+        if not os.path.exists(self.data_path(dataset_id, schema)):
+            return None
+        return read_json(self.meta_path(dataset_id, schema))
+
+    def version(self, dataset_id, schema="raw"):
+        """
+        A string that changes when the saved data does: the ETag of the
+        download, or the time the file was written when there isn't one.
+        None if there is no snapshot.
+        """
+        meta = self.meta(dataset_id, schema)
+        if meta is None:
+            return None
+        if meta.get("etag"):
+            return meta["etag"]
+        return str(os.stat(self.data_path(dataset_id, schema)).st_mtime_ns)
+
+    def is_fresh(self, meta):
+        return meta is not None and time.time() - meta["fetched_at"] < self.ttl
+
+    def load(self, dataset_id, url, clean=None, schema="raw", dtype=None):
+        """
+        Return the dataset `dataset_id` as a DataFrame, downloading it
+        from `url` only when the local snapshot is missing or out of date.
+        - clean: optional function applied to the downloaded frame before
+          it is saved, so that the snapshot holds the cleaned data
+        - schema: name of the shape of the saved frame, change it whenever
+          `clean` produces different columns or values
+        - dtype: dtypes for read_csv, for columns that mix numbers and text
+        """
+        meta = self.meta(dataset_id, schema)
+
+        if meta is not None and (self.offline or self.is_fresh(meta)):
+            return self.read(dataset_id, schema)
+
+        if self.offline:
+            raise FileNotFoundError(f"No local snapshot of {self.key(dataset_id, schema)} in {self.path}")
+
+        headers = {}
+        if meta is not None and meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta is not None and meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+
+        # only needed to refresh a snapshot, not to read one
+        import requests
+
+        try:
+            with metrics.stage("fetch"):
+                response = requests.get(url, headers=headers, timeout=self.timeout)
+                response.raise_for_status()
+        except requests.RequestException as e:
+            if meta is None:
+                raise
+            warnings.warn(f"Could not refresh {self.key(dataset_id, schema)}, using the local snapshot: {e}")
+            return self.read(dataset_id, schema)
+
+        if response.status_code == 304 and meta is not None:
+            meta["fetched_at"] = time.time()
+            self._write_meta(dataset_id, schema, meta)
+            return self.read(dataset_id, schema)
+
+        with metrics.stage("parse_csv") as stage:
+            # the whole file at once, so a column with text late in a big
+            # download isn't read as numbers in some chunks and text in others
+            df = pd.read_csv(io.BytesIO(response.content), dtype=dtype, low_memory=False)
+            stage.rows = len(df)
+        if clean is not None:
+            df = clean(df)
+
+        meta = {
+            "dataset": dataset_id,
+            "schema": schema,
+            "url": url,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "fetched_at": time.time(),
+            "rows": len(df)
+        }
+        self.write(df, dataset_id, schema, meta)
+        return df
+
+    @metrics.timed("read_snapshot")
+    def read(self, dataset_id, schema="raw"):
+        return read_parquet(self.data_path(dataset_id, schema))
+
+    def write(self, df, dataset_id, schema="raw", meta=None):
+        """save `df` and its metadata, replacing any earlier snapshot"""
+        write_parquet(df, self.data_path(dataset_id, schema))
+
+        if meta is None:
+            meta = {"dataset": dataset_id, "schema": schema, "fetched_at": time.time(), "rows": len(df)}
+        self._write_meta(dataset_id, schema, meta)
+
+    def clear(self, dataset_id, schema="raw"):
+        for path in [self.data_path(dataset_id, schema), self.meta_path(dataset_id, schema)]:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _write_meta(self, dataset_id, schema, meta):
+        write_json(meta, self.meta_path(dataset_id, schema))
+
+
+def read_parquet(path):
+    return restore_nan(pd.read_parquet(path))
+
+
+def restore_nan(df):
+    """
+    Parquet and Arrow hand back missing strings as None, put the NaN
+    back so that the frame matches the one that was saved
+    """
+    for col in df.columns[df.dtypes == object]:
+        missing = df[col].isna()
+        if missing.any():
+            df.loc[missing, col] = np.nan
+    return df
+
+
+def write_parquet(df, path):
+    """write `df` to `path` through a temporary file, so readers never see half a file"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    df.to_parquet(tmp, index=True)
+    os.replace(tmp, path)
+
+
+def read_json(path):
+    """the JSON saved at `path`, or None if it is missing or unreadable"""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_json(data, path):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp, path)
+
+
+_default_store = None
+
+
+def default_store():
+    """the store used by the loaders when they aren't given one"""
+    global _default_store
+    if _default_store is None:
+        _default_store = SnapshotStore(
+            os.environ.get("SCHOOL_DATA_CACHE", DEFAULT_CACHE_DIR),
+            ttl=float(os.environ.get("SCHOOL_DATA_TTL", DEFAULT_TTL)),
+            offline=os.environ.get("SCHOOL_DATA_OFFLINE", "") not in ("", "0"))
+    return _default_store
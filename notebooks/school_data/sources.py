@@ -0,0 +1,76 @@
+"""
+Where the loaders in `schools.py` read the raw open data from.
+
+By default the loaders download from the open data portal through the
+snapshot store. A source replaces that with something else:
+
+- `FileSource`: CSV (or gzipped CSV, or Parquet) files named by dataset
+  id in a directory, for frozen fixtures and working offline
+- `FrameSource`: DataFrames already in memory
+- `HTTPSource`: a straight download, without the snapshot store
+
+    df = schools.load_demographics(source=FileSource("test/fixtures"))
+
+Setting the `SCHOOL_DATA_SOURCE` environment variable to a directory
+makes a `FileSource` for it the default.
+"""
+import os
+
+import pandas as pd
+
+# file types a FileSource looks for, in order
+EXTENSIONS = [".csv", ".csv.gz", ".parquet"]
+
+
+class FileSource:
+    def __init__(self, path, dtype=None):
+        """
+        - path: directory of files named <dataset id>.csv (or .csv.gz, .parquet)
+        - dtype: dtypes for read_csv
+        """
+        self.path = os.path.expanduser(path)
+        self.dtype = dtype
+
+    def file(self, dataset_id):
+        for ext in EXTENSIONS:
+            path = os.path.join(self.path, dataset_id + ext)
+            if os.path.exists(path):
+                return path
+        raise FileNotFoundError(f"No file for {dataset_id} in {self.path}")
+
+    def read(self, dataset_id):
+        path = self.file(dataset_id)
+        if path.endswith(".parquet"):
+            return pd.read_parquet(path)
+        return pd.read_csv(path, dtype=self.dtype)
+
+
+class FrameSource:
+    def __init__(self, frames):
+        """
+        - frames: a dict of dataset id to its raw DataFrame
+        """
+        self.frames = frames
+
+    def read(self, dataset_id):
+        if dataset_id not in self.frames:
+            raise KeyError(f"No frame for {dataset_id}")
+        # the loaders clean in place, keep the fixture as it was
+        return self.frames[dataset_id].copy()
+
+
+class HTTPSource:
+    def __init__(self, url):
+        """
+        - url: the dataset url with {} for the dataset id
+        """
+        self.url = url
+
+    def read(self, dataset_id):
+        return pd.read_csv(self.url.format(dataset_id))
+
+
+def default_source():
+    """a FileSource for SCHOOL_DATA_SOURCE, or None to use the snapshot store"""
+    path = os.environ.get("SCHOOL_DATA_SOURCE")
+    return FileSource(path) if path else None
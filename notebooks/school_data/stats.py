@@ -0,0 +1,70 @@
+"""
+The statistical tests on the cleaned school data.
+
+These need scipy, ksdisc and joblib, which take longer to import than
+everything else in `school_data` together. `schools.py` only imports
+this module the first time one of its functions is used, so loading
+and searching the data (all the Mycroft skill does) doesn't pay for it:
+
+    schools.segregation_test(df)  # imports stats and segregation here
+"""
+import pandas as pd
+
+from . import metrics, segregation
+
+
+@metrics.timed()
+def segregation_test(demo_df, ks="legacy", seed=None, n_jobs=None, output=None):
+    """
+    Here we perform the chi-square test to see the segregation of the
+    ethnic populations for each school...
+    Let us recall that we want to compare the distribution at the level
+    of district with the distribution at the level of school.
+    We have four cathegories asian, black, white and hispanic;
+    each school has its own observed frequencies f_obs and we are going to
+    compare with the expected frequencies f_exp from the distribution at the district level...
+    All of the schools are tested at once, see `segregation.py`.
+    Returns a DataFrame with the index of `demo_df` and the columns dbn, year,
+    p_value_chi2test, chi2_value_chi2test and p_value_KStest.
+    - ks: "legacy" (the default) computes the KS test as the original
+          row-by-row test did, dropping a random student from the larger
+          sample and using ksdisc's statistic. "exact" keeps every student
+          and compares the samples as they are, which gives different
+          KS p-values
+    - seed: an int or numpy Generator, pass one to get the same KS p-values
+            every time the test is run
+    - n_jobs: run each district separately in this many processes
+              (-1 for one per core), None to test everything in this process
+    - output: optional path to save the results to, as .parquet, .feather or .csv
+    """
+    if n_jobs is None:
+        stats = segregation.segregation_stats(demo_df, ks=ks, seed=seed)
+    else:
+        stats = segregation.partitioned_stats(demo_df, n_jobs=n_jobs, ks=ks, seed=seed)
+    chi2_pvalue_data, chi2_value_data, KS_pvalue_data = stats
+
+    results = pd.DataFrame({
+        "dbn": demo_df.dbn,
+        "year": demo_df.year,
+        "p_value_chi2test": chi2_pvalue_data,
+        "chi2_value_chi2test": chi2_value_data,
+        "p_value_KStest": KS_pvalue_data
+    }, index=demo_df.index)
+
+    # Since the script spent some time until finish, it is better to keep the results in a file
+    if output is not None:
+        save_results(results, output)
+    return results
+
+
+def save_results(df, path):
+    """save a frame of results as parquet, feather or csv, by the extension of `path`"""
+    if path.endswith(".parquet"):
+        df.to_parquet(path)
+    elif path.endswith(".feather"):
+        # feather can't store an index, keep it as a column
+        df.reset_index().to_feather(path)
+    elif path.endswith(".csv"):
+        df.to_csv(path)
+    else:
+        raise ValueError(f"Unknown file type for {path}, expected .parquet, .feather or .csv")
@@ -0,0 +1,238 @@
+"""
+Synthetic open data with the same columns and value formats as the
+NYC demographic snapshot, for tests and benchmarks that can't (or
+shouldn't) download the real thing.
+
+    raw = synthetic.make_demographics(n_schools=2000, years=range(2015, 2020))
+    df = schools.clean_demographics(raw)
+
+`write_csvs` saves demographics and test results as CSV files like the
+ones the portal serves.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+# the columns of the raw demographic snapshot, in open data order
+DEMOGRAPHICS_COLS = ['dbn', 'school_name', 'year', 'total_enrollment',
+    'grade_3k_pk_half_day_full', 'grade_k', 'grade_1', 'grade_2', 'grade_3',
+    'grade_4', 'grade_5', 'grade_6', 'grade_7', 'grade_8', 'grade_9',
+    'grade_10', 'grade_11', 'grade_12', 'female', 'female_1', 'male',
+    'male_1', 'asian', 'asian_1', 'black', 'black_1', 'hispanic',
+    'hispanic_1', 'multiple_race_categories', 'multiple_race_categories_1',
+    'white', 'white_1', 'students_with_disabilities',
+    'students_with_disabilities_1', 'english_language_learners',
+    'english_language_learners_1', 'poverty', 'poverty_1',
+    'economic_need_index']
+
+GRADES = ['grade_3k_pk_half_day_full', 'grade_k', 'grade_1', 'grade_2', 'grade_3',
+    'grade_4', 'grade_5', 'grade_6', 'grade_7', 'grade_8', 'grade_9',
+    'grade_10', 'grade_11', 'grade_12']
+
+RACES = ['asian', 'black', 'hispanic', 'multiple_race_categories', 'white']
+
+DISTRICTS = {"M": [1, 2, 3, 4, 5, 6], "X": [7, 8, 9, 10, 11, 12],
+    "K": [13, 14, 15, 16, 17, 18, 19, 20, 21, 22, 23, 32],
+    "Q": [24, 25, 26, 27, 28, 29, 30], "R": [31]}
+
+# school types and the grades they serve
+LEVELS = {
+    "PS": ['grade_3k_pk_half_day_full', 'grade_k', 'grade_1', 'grade_2', 'grade_3', 'grade_4', 'grade_5'],
+    "MS": ['grade_6', 'grade_7', 'grade_8'],
+    "HS": ['grade_9', 'grade_10', 'grade_11', 'grade_12'],
+    "K8": ['grade_k', 'grade_1', 'grade_2', 'grade_3', 'grade_4', 'grade_5', 'grade_6', 'grade_7', 'grade_8'],
+}
+
+# the different ways school names are written on the portal
+NAME_FORMATS = {
+    "PS": ["P.S. {num:03d} {name}", "P.S. {num} {name}", "P. S. {num:03d} {name}", "{name} Elementary School"],
+    "MS": ["M.S. {num:03d} {name}", "I.S. {num:03d} {name}", "J.H.S. {num:03d} {name}", "{name} Middle School"],
+    "HS": ["{name} High School", "{name} Academy", "High School for {name}"],
+    "K8": ["P.S./I.S. {num:03d} {name}", "{name} Charter School", "The {name} School"],
+}
+
+NAMES = ["Roberto Clemente", "Asher Levy", "Anna Silver", "Franklin D. Roosevelt",
+    "Peter Rouget", "Isaac Bildersee", "Carroll Gardens", "Park Slope",
+    "Lewis H. Latimer", "Sunset Park", "Brooklyn Arbor", "Harlem Hebrew",
+    "Bronx Arts", "Queens Collegiate", "Lower East Side Prep", "Museum",
+    "Liberty", "Curious Young Learners", "Dock Street", "Boerum Hill",
+    "International Studies", "Environmental Science", "Math & Science",
+    "Pan American", "O'Brien", "Edward R. Murrow", "John F. Kennedy",
+    "Hudson Cliffs", "Richmond Hill", "St. George"]
+
+
+def _pct(count, total):
+    return np.round(count / np.maximum(total, 1), 3)
+
+
+def _pct_strings(share):
+    """format shares the way the portal does for poverty ("72.1%", "Above 95%")"""
+    text = np.char.add(np.round(share * 100, 1).astype(str), "%")
+    text = np.where(share > .95, "Above 95%", text)
+    return np.where(share < .05, "Below 5%", text)
+
+
+def make_schools(n_schools=1800, seed=0):
+    """
+    Make a frame of `n_schools` schools with dbn, school_name and level
+    that stay the same from year to year.
+    """
+    rng = np.random.default_rng(seed)
+
+    boros = list(DISTRICTS)
+    levels = list(LEVELS)
+    rows = []
+    used = set()
+    while len(rows) < n_schools:
+        boro = boros[rng.integers(len(boros))]
+        district = DISTRICTS[boro][rng.integers(len(DISTRICTS[boro]))]
+        num = int(rng.integers(1, 1000))
+        dbn = f"{district:02d}{boro}{num:03d}"
+        if dbn in used:
+            continue
+        used.add(dbn)
+
+        level = levels[rng.integers(len(levels))]
+        formats = NAME_FORMATS[level]
+        name = formats[rng.integers(len(formats))].format(num=num, name=NAMES[rng.integers(len(NAMES))])
+        rows.append((dbn, name, level))
+
+    return pd.DataFrame(rows, columns=["dbn", "school_name", "level"])
+
+
+def make_demographics(n_schools=1800, years=range(2015, 2020), seed=0):
+    """
+    Make a raw demographic frame shaped like the open data snapshot
+    (see `DEMOGRAPHICS_COLS`), with one row per school per year.
+    - n_schools: number of distinct schools (dbn)
+    - years: fall years of the school years to include (2015 -> "2015-16")
+    - seed: seed for the random numbers, the same seed makes the same frame
+    """
+    rng = np.random.default_rng(seed)
+    schools = make_schools(n_schools, seed)
+
+    years = list(years)
+    df = schools.loc[schools.index.repeat(len(years))].reset_index(drop=True)
+    df["year"] = [f"{y}-{(y + 1) % 100:02d}" for y in years] * n_schools
+    n = len(df)
+
+    for grade in GRADES:
+        df[grade] = 0
+    for level, grades in LEVELS.items():
+        rows = df.level == level
+        for grade in grades:
+            df.loc[rows, grade] = rng.integers(10, 150, rows.sum())
+
+    total = df[GRADES].sum(axis=1).to_numpy()
+    df["total_enrollment"] = total
+
+    female = rng.binomial(total, .49)
+    df["female"] = female
+    df["female_1"] = _pct(female, total)
+    df["male"] = total - female
+    df["male_1"] = _pct(total - female, total)
+
+    # split each school across the race categories
+    mix = rng.dirichlet([1, 2, 2, .3, 1], n)
+    counts = np.floor(mix * total[:, None]).astype(int)
+    counts[:, 1] += total - counts.sum(axis=1)
+    for i, race in enumerate(RACES):
+        df[race] = counts[:, i]
+        df[race + "_1"] = _pct(counts[:, i], total)
+
+    for group, p in [("students_with_disabilities", .2), ("english_language_learners", .13)]:
+        count = rng.binomial(total, p)
+        df[group] = count
+        df[group + "_1"] = _pct(count, total)
+
+    # poverty comes from the portal as text with "Above 95%" / "Below 5%"
+    share = rng.beta(5, 2, n)
+    poverty = np.round(share * total).astype(int).astype(str)
+    poverty = np.where(share > .95, "Above 95%", poverty)
+    df["poverty"] = np.where(share < .05, "Below 5%", poverty)
+    df["poverty_1"] = _pct_strings(share)
+    df["economic_need_index"] = _pct_strings(np.clip(share + rng.normal(0, .05, n), 0, 1))
+
+    return df[DEMOGRAPHICS_COLS]
+
+
+# the columns of the raw math and ELA test results, in open data order
+TEST_COLS = ['dbn', 'school_name', 'grade', 'year', 'category', 'number_tested',
+    'mean_scale_score', 'level_1', 'level_1_1', 'level_2', 'level_2_1',
+    'level_3', 'level_3_1', 'level_4', 'level_4_1', 'level_3_4',
+    'level_3_4_1']
+
+CATEGORIES = ["All Students", "Female", "Male", "Asian", "Black", "Hispanic",
+    "White", "Multi-Racial", "SWD", "Not SWD", "Econ Disadv", "Not Econ Disadv",
+    "Current ELL", "Ever ELL", "Never ELL"]
+
+# the grades tested by each school level
+TESTED_GRADES = {"PS": ["3", "4", "5"], "MS": ["6", "7", "8"], "HS": [],
+    "K8": ["3", "4", "5", "6", "7", "8"]}
+
+
+def make_tests(n_schools=1800, years=range(2013, 2020), seed=0):
+    """
+    Make a raw math or ELA test result frame shaped like the open data
+    snapshot (see `TEST_COLS`): one row per school, year, grade ("3".."8"
+    and "All Grades") and category of students. Results for fewer than
+    5 students are suppressed with "s", like the real data.
+    - n_schools: number of distinct schools, the same ones (dbn) that
+      `make_demographics` makes with the same seed
+    - years: years of the tests
+    - seed: seed for the random numbers
+    """
+    rng = np.random.default_rng(seed)
+    schools = make_schools(n_schools, seed)
+
+    rows = []
+    for dbn, name, level in schools.itertuples(index=False):
+        grades = TESTED_GRADES[level]
+        if not grades:
+            continue
+        # not every school has students in every category
+        cats = [cat for cat in CATEGORIES if cat == "All Students" or rng.random() > .15]
+        for year in years:
+            for grade in grades + ["All Grades"]:
+                for cat in cats:
+                    rows.append((dbn, name, grade, year, cat))
+
+    df = pd.DataFrame(rows, columns=["dbn", "school_name", "grade", "year", "category"])
+    n = len(df)
+
+    tested = rng.integers(0, 120, n)
+    df["number_tested"] = tested
+    df["mean_scale_score"] = rng.integers(250, 350, n)
+    levels = np.floor(rng.dirichlet([2, 3, 3, 1], n) * tested[:, None]).astype(int)
+    levels[:, 0] += tested - levels.sum(axis=1)
+    for i in range(4):
+        df[f"level_{i + 1}"] = levels[:, i]
+        df[f"level_{i + 1}_1"] = np.round(100 * levels[:, i] / np.maximum(tested, 1), 1)
+    df["level_3_4"] = levels[:, 2] + levels[:, 3]
+    df["level_3_4_1"] = np.round(100 * df.level_3_4 / np.maximum(tested, 1), 1)
+
+    # small groups are suppressed, which makes the score columns text
+    suppressed = tested < 5
+    for col in TEST_COLS[6:]:
+        df[col] = df[col].astype(str).where(~suppressed, "s")
+
+    return df[TEST_COLS]
+
+
+def write_csvs(path, n_schools=1800, years=range(2015, 2020), test_years=range(2013, 2020), seed=0):
+    """
+    Write demographics.csv, math.csv and ela.csv to the directory `path`,
+    in the format of the open data downloads. Return a dict of the paths.
+    """
+    os.makedirs(path, exist_ok=True)
+    frames = {
+        "demographics": make_demographics(n_schools, years, seed),
+        "math": make_tests(n_schools, test_years, seed),
+        "ela": make_tests(n_schools, test_years, seed + 1),
+    }
+    paths = {}
+    for name, df in frames.items():
+        paths[name] = os.path.join(path, name + ".csv")
+        df.to_csv(paths[name], index=False)
+    return paths
@@ -0,0 +1,102 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+from school_data import aggregates, schema, schools, snapshots, sources, synthetic
+from test import fixtures
+
+
+class RollupTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.df = schools.clean_demographics(synthetic.make_demographics(300))
+        cls.aggs = aggregates.Aggregates(aggregates.rollup(cls.df))
+
+    def test_districts_match_calc_districts(self):
+        expected = schools.calc_districts(self.df)
+        districts = self.aggs.level("district").reset_index()
+        for col in aggregates.SUMS + ["num_schools", "black_pct"]:
+            np.testing.assert_allclose(districts[col], expected[col], err_msg=col)
+
+    def test_levels_add_up(self):
+        for year in self.df.year.unique():
+            rows = self.df[self.df.year == year]
+            city = self.aggs.city(year)
+            self.assertEqual(city.total_enrollment, rows.total_enrollment.sum())
+            self.assertEqual(city.num_schools, len(rows))
+            brooklyn = rows[rows.boro == "K"]
+            self.assertEqual(self.aggs.boro("K", year).black, brooklyn.black.sum())
+            d2 = rows[rows.district == 2]
+            self.assertAlmostEqual(self.aggs.district(2, year).white_pct,
+                d2.white.sum() / d2.total_enrollment.sum())
+
+    def test_all_years(self):
+        years = sorted(self.df.year.unique())
+        self.assertEqual(list(self.aggs.city().index), years)
+        self.assertEqual(list(self.aggs.district("02").index), years)
+
+    def test_compact_frame(self):
+        compact = aggregates.rollup(schema.compact(self.df, schema.DEMOGRAPHICS))
+        pd.testing.assert_frame_equal(compact.astype(float), self.aggs.table.astype(float))
+
+    def test_missing_area(self):
+        with self.assertRaises(KeyError):
+            self.aggs.district(99, 2015)
+
+
+class MaterializeTestCase(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.store = snapshots.SnapshotStore(self.path)
+        self.df = schools.clean_demographics(synthetic.make_demographics(50))
+        self.store.write(self.df, schools.DEMOGRAPHICS_ID, schools.DEMOGRAPHICS_SCHEMA)
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def materialize(self):
+        return aggregates.materialize(self.df, self.store, schools.DEMOGRAPHICS_ID,
+            schools.DEMOGRAPHICS_SCHEMA)
+
+    def test_saved_and_reused(self):
+        first = self.materialize()
+        path = self.store.data_path(schools.DEMOGRAPHICS_ID, schools.DEMOGRAPHICS_SCHEMA + "-aggregates")
+        self.assertTrue(os.path.exists(path))
+        with mock.patch.object(aggregates, "rollup") as rollup:
+            second = self.materialize()
+        rollup.assert_not_called()
+        pd.testing.assert_frame_equal(first.table, second.table)
+
+    def test_recalculated_for_a_new_snapshot(self):
+        self.materialize()
+        self.df = schools.clean_demographics(synthetic.make_demographics(60))
+        self.store.write(self.df, schools.DEMOGRAPHICS_ID, schools.DEMOGRAPHICS_SCHEMA)
+        # make sure the new file doesn't look as old as the first one
+        data_path = self.store.data_path(schools.DEMOGRAPHICS_ID, schools.DEMOGRAPHICS_SCHEMA)
+        os.utime(data_path, (0, os.path.getmtime(data_path) + 10))
+        aggs = self.materialize()
+        self.assertEqual(aggs.city().num_schools.iloc[0], 60)
+
+    def test_without_a_snapshot_file(self):
+        store = snapshots.SnapshotStore(os.path.join(self.path, "empty"))
+        aggs = aggregates.materialize(self.df, store, schools.DEMOGRAPHICS_ID,
+            schools.DEMOGRAPHICS_SCHEMA)
+        self.assertEqual(aggs.city().num_schools.iloc[0], 50)
+        self.assertFalse(os.path.exists(store.path) and os.listdir(store.path))
+
+    def test_load_aggregates_from_a_file_source(self):
+        expected = aggregates.rollup(schools.load_demographics(source=sources.FileSource(fixtures.DATA_DIR)))
+        with mock.patch.dict(os.environ, {"SCHOOL_DATA_SOURCE": fixtures.DATA_DIR}):
+            aggs = schools.load_aggregates(self.store)
+        pd.testing.assert_frame_equal(aggs.table, expected)
+        aggs = schools.load_aggregates(source=sources.FileSource(fixtures.DATA_DIR))
+        pd.testing.assert_frame_equal(aggs.table, expected)
+
+    def test_load_aggregates_offline(self):
+        offline = snapshots.SnapshotStore(self.path, offline=True)
+        aggs = schools.load_aggregates(offline)
+        self.assertEqual(aggs.city().num_schools.iloc[0], 50)
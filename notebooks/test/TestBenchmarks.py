@@ -0,0 +1,42 @@
+import json
+import unittest
+
+from benchmarks import run, timing
+
+
+class BenchmarkHarnessTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.results = run.run_benchmarks(n_schools=20, repeat=1)
+
+    def test_every_stage_is_measured(self):
+        stages = self.results["stages"]
+        self.assertEqual(list(stages), [name for name, _ in run.stages({}, "")])
+        for name, stage in stages.items():
+            self.assertGreater(stage["seconds"], 0, name)
+            self.assertGreaterEqual(stage["peak_mb"], 0, name)
+        self.assertEqual(stages["load_demographics"]["rows"], 100)
+
+    def test_json(self):
+        results = json.loads(json.dumps(self.results))
+        self.assertEqual(results["n_schools"], 20)
+
+    def test_compare(self):
+        old = json.loads(json.dumps(self.results))
+        self.assertEqual(run.compare(self.results, old, 1.5), [])
+        old["stages"]["calc_districts"]["seconds"] /= 10
+        self.assertEqual(run.compare(self.results, old, 1.5), ["calc_districts"])
+
+
+class TimingTestCase(unittest.TestCase):
+    def test_best_time_setup(self):
+        inputs = []
+        seconds, result = timing.best_time(lambda x: x + 1, 3, lambda: inputs.append(1) or len(inputs))
+        self.assertEqual(inputs, [1, 1, 1])
+        self.assertEqual(result, 4)
+        self.assertGreaterEqual(seconds, 0)
+
+    def test_measure(self):
+        seconds, peak, result = timing.measure(lambda: list(range(100000)), repeat=2)
+        self.assertGreater(peak, .5)
+        self.assertEqual(len(result), 100000)
@@ -0,0 +1,69 @@
+import json
+import os
+import subprocess
+import sys
+import unittest
+
+from school_data import schools
+
+# modules the skill shouldn't pay for when it imports school_data
+HEAVY = ["scipy", "ksdisc", "joblib", "requests", "school_data.segregation",
+    "school_data.stats", "school_data.ingest"]
+
+# the only packages outside the standard library that school_data
+# may import on top of pandas and numpy: fuzzy matching and JSON
+LIGHT = ["school_data", "fuzzywuzzy", "Levenshtein", "rapidfuzz", "orjson"]
+
+# share of the time pandas and numpy take to import that school_data
+# can take on top of them, scipy alone takes more than this
+IMPORT_SHARE = .5
+
+IMPORT_TIME = """
+import json, sys, time
+start = time.perf_counter()
+import numpy, pandas
+libraries = time.perf_counter()
+before = set(sys.modules)
+import school_data.schools, school_data.search, school_data.snapshots, school_data.payloads
+end = time.perf_counter()
+print(json.dumps({"libraries": libraries - start, "school_data": end - libraries,
+    "modules": sorted(sys.modules), "new": sorted(set(sys.modules) - before)}))
+"""
+
+
+def cold_import():
+    """import the skill's modules in a new interpreter, and time it"""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    out = subprocess.run([sys.executable, "-c", IMPORT_TIME], cwd=root,
+        capture_output=True, text=True, check=True).stdout
+    return json.loads(out)
+
+
+class ImportTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.result = cold_import()
+
+    def test_heavy_modules_are_deferred(self):
+        loaded = [name for name in HEAVY if name in self.result["modules"]]
+        self.assertEqual(loaded, [])
+
+    def test_only_light_packages(self):
+        stdlib = getattr(sys, "stdlib_module_names", ())
+        packages = {name.split(".")[0] for name in self.result["new"]}
+        heavy = [name for name in packages
+            if name not in LIGHT and name not in stdlib and not name.startswith("_")]
+        self.assertEqual(heavy, [])
+
+    def test_import_time(self):
+        # measured against pandas in the same interpreter, so a slow
+        # machine slows down both
+        self.assertLess(self.result["school_data"], IMPORT_SHARE * self.result["libraries"],
+            f"school_data took {self.result['school_data']:.3f}s to import, "
+            f"pandas and numpy {self.result['libraries']:.3f}s")
+
+    def test_lazy_functions(self):
+        self.assertIs(schools.segregation_test, schools.stats.segregation_test)
+        self.assertIs(schools.ingest, sys.modules["school_data.ingest"])
+        with self.assertRaises(AttributeError):
+            schools.no_such_function
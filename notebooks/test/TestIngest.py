@@ -0,0 +1,213 @@
+import io
+import os
+import shutil
+import tempfile
+import threading
+import tracemalloc
+import unittest
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
+
+import pandas as pd
+from school_data import ingest, schools, snapshots, synthetic
+
+# the memory and timing comparisons only run when this is set,
+# they depend on the machine more than the other tests
+BENCHMARKS = os.environ.get("SCHOOL_DATA_BENCHMARKS") == "1"
+
+
+class SoQLHandler(BaseHTTPRequestHandler):
+    """serves a frame as CSV, understanding the year queries ingest makes"""
+    df = synthetic.make_demographics(40, years=range(2015, 2018))
+    # a prepared response for the whole frame
+    body = None
+    requests = []
+
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query)
+        SoQLHandler.requests.append(query)
+        df = self.df
+        if "$select" in query:
+            df = df[["year"]].drop_duplicates()
+        elif "$where" in query:
+            year = query["$where"][0].split("=", 1)[1].strip("'")
+            df = df[df.year.astype(str) == year]
+        elif "$offset" in query:
+            offset = int(query["$offset"][0])
+            df = df.iloc[offset:offset + int(query["$limit"][0])]
+        elif self.body is not None:
+            self.send(self.body)
+            return
+        self.send(df.to_csv(index=False).encode())
+
+    def send(self, body):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/csv")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class IngestTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = HTTPServer(("127.0.0.1", 0), SoQLHandler)
+        cls.url = f"http://127.0.0.1:{cls.server.server_port}/resource/{{}}.csv?$limit=10000000"
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        SoQLHandler.requests = []
+        SoQLHandler.df = synthetic.make_demographics(40, years=range(2015, 2018))
+        SoQLHandler.body = None
+        self.store = snapshots.SnapshotStore(self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_only_new_years_are_fetched(self):
+        parts = ingest.YearPartitions(self.path)
+        url = self.url.format("nie4-bv6q")
+        new = ingest.ingest(url, parts, clean=schools.clean_demographics, dtype=schools.DEMOGRAPHICS_TEXT)
+        self.assertEqual(parts.years(), ["2015-16", "2016-17", "2017-18"])
+        self.assertEqual(len(new), 120)
+
+        SoQLHandler.requests = []
+        old = SoQLHandler.df
+        SoQLHandler.df = synthetic.make_demographics(40, years=range(2015, 2019))
+        new = ingest.ingest(url, parts, clean=schools.clean_demographics, dtype=schools.DEMOGRAPHICS_TEXT)
+        self.assertEqual(new.year.unique().tolist(), [2018])
+        wheres = [q["$where"][0] for q in SoQLHandler.requests if "$where" in q]
+        self.assertEqual(wheres, ["year='2018-19'"])
+
+        # the saved years are kept, and the partitions come back one year after the other
+        raw = pd.concat([old, SoQLHandler.df[SoQLHandler.df.year == "2018-19"]])
+        expected = schools.clean_demographics(raw.reset_index(drop=True))
+        expected = expected.sort_values(by="year", kind="mergesort", ignore_index=True)
+        pd.testing.assert_frame_equal(parts.read(), expected)
+
+    def test_numeric_years(self):
+        SoQLHandler.df = synthetic.make_tests(10, years=range(2017, 2019))
+        parts = ingest.YearPartitions(self.path)
+        ingest.ingest(self.url.format("m27t-ht3h"), parts)
+        self.assertEqual(parts.years(), [2017, 2018])
+        wheres = [q["$where"][0] for q in SoQLHandler.requests if "$where" in q]
+        self.assertEqual(wheres, ["year=2017", "year=2018"])
+
+    def test_districts_are_updated_in_place(self):
+        with mock.patch.object(schools, "OPEN_DATA_URL", self.url):
+            df, districts = schools.ingest_demographics(self.store)
+            self.assertEqual(sorted(districts.year.unique()), [2015, 2016, 2017])
+
+            SoQLHandler.df = synthetic.make_demographics(40, years=range(2015, 2019))
+            with mock.patch.object(schools, "calc_districts", wraps=schools.calc_districts) as calc:
+                df, districts = schools.ingest_demographics(self.store)
+            self.assertEqual(calc.call_count, 1)
+            self.assertEqual(calc.call_args[0][0].year.unique().tolist(), [2018])
+
+        pd.testing.assert_frame_equal(districts, schools.calc_districts(df))
+
+    def test_offline_reads_partitions(self):
+        with mock.patch.object(schools, "OPEN_DATA_URL", self.url):
+            schools.ingest_demographics(self.store)
+            SoQLHandler.requests = []
+            offline = snapshots.SnapshotStore(self.path, offline=True)
+            df, districts = schools.ingest_demographics(offline)
+        self.assertEqual(SoQLHandler.requests, [])
+        self.assertEqual(len(df), 120)
+
+
+class StreamTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = HTTPServer(("127.0.0.1", 0), SoQLHandler)
+        cls.base = f"http://127.0.0.1:{cls.server.server_port}/resource/{{}}.csv"
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        SoQLHandler.requests = []
+        SoQLHandler.df = synthetic.make_demographics(100, years=range(2015, 2018))
+        SoQLHandler.body = None
+        self.patches = [mock.patch.object(schools, "RESOURCE_URL", self.base),
+            mock.patch.object(schools, "OPEN_DATA_URL", self.base + "?$limit=10000000")]
+        for patch in self.patches:
+            patch.start()
+
+    def tearDown(self):
+        for patch in self.patches:
+            patch.stop()
+        shutil.rmtree(self.path)
+
+    def expected(self):
+        raw = pd.read_csv(io.StringIO(SoQLHandler.df.to_csv(index=False)))
+        return schools.clean_demographics(raw)
+
+    def test_chunks(self):
+        path = os.path.join(self.path, "demographics")
+        rows = schools.stream_demographics(path, chunksize=70)
+        self.assertEqual(rows, 300)
+        self.assertEqual(len(os.listdir(path)), 5)
+        pd.testing.assert_frame_equal(ingest.read_chunks(path), self.expected())
+
+    def test_pages(self):
+        path = os.path.join(self.path, "demographics")
+        rows = schools.stream_demographics(path, chunksize=100, paged=True)
+        self.assertEqual(rows, 300)
+        offsets = [q["$offset"][0] for q in SoQLHandler.requests]
+        self.assertEqual(offsets, ["0", "100", "200", "300"])
+        pd.testing.assert_frame_equal(ingest.read_chunks(path), self.expected())
+
+    def test_replaces_old_parts(self):
+        path = os.path.join(self.path, "demographics")
+        schools.stream_demographics(path, chunksize=70)
+        SoQLHandler.df = SoQLHandler.df.iloc[:50]
+        schools.stream_demographics(path, chunksize=70)
+        self.assertEqual(os.listdir(path), ["part-00000.parquet"])
+        self.assertEqual(len(ingest.read_chunks(path)), 50)
+
+    def peak_memory(self, n_schools):
+        SoQLHandler.df = synthetic.make_demographics(n_schools, years=range(2015, 2020))
+        SoQLHandler.body = SoQLHandler.df.to_csv(index=False).encode()
+        path = os.path.join(self.path, str(n_schools))
+
+        tracemalloc.start()
+        schools.stream_demographics(path, chunksize=500)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return peak
+
+    def test_cleans_one_chunk_at_a_time(self):
+        SoQLHandler.df = synthetic.make_demographics(400, years=range(2015, 2020))
+        SoQLHandler.body = SoQLHandler.df.to_csv(index=False).encode()
+        sizes = []
+        clean_demographics = schools.clean_demographics
+
+        def clean(df):
+            sizes.append(len(df))
+            return clean_demographics(df)
+
+        with mock.patch.object(schools, "clean_demographics", clean):
+            rows = schools.stream_demographics(os.path.join(self.path, "chunks"), chunksize=500)
+        self.assertEqual(rows, 2000)
+        self.assertEqual(sizes, [500] * 4)
+
+    @unittest.skipUnless(BENCHMARKS, "set SCHOOL_DATA_BENCHMARKS=1 to compare peak memory")
+    def test_memory_does_not_grow_with_the_data(self):
+        small = self.peak_memory(400)
+        large = self.peak_memory(1600)
+        self.assertLess(large, 1.5 * small)
@@ -0,0 +1,92 @@
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+from school_data import schools, snapshots, synthetic
+
+
+class SlowPortalHandler(BaseHTTPRequestHandler):
+    """serves each dataset after a delay, several requests at a time"""
+    delay = .5
+    bodies = {
+        schools.DEMOGRAPHICS_ID: synthetic.make_demographics(30).to_csv(index=False).encode(),
+        schools.MATH_TESTS_ID: synthetic.make_tests(30).to_csv(index=False).encode(),
+        schools.ELA_TESTS_ID: synthetic.make_tests(30, seed=1).to_csv(index=False).encode(),
+        schools.CHARTER_MATH_ID: synthetic.make_tests(10, seed=2).to_csv(index=False).encode(),
+    }
+
+    # the most requests that were being served at once
+    lock = threading.Lock()
+    active = 0
+    most_active = 0
+
+    def do_GET(self):
+        dataset_id = self.path.split("/")[-1].split(".")[0]
+        with self.lock:
+            SlowPortalHandler.active += 1
+            SlowPortalHandler.most_active = max(self.most_active, self.active)
+        time.sleep(self.delay)
+        with self.lock:
+            SlowPortalHandler.active -= 1
+        body = self.bodies[dataset_id]
+        self.send_response(200)
+        self.send_header("Content-Type", "text/csv")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class LoadAllTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), SlowPortalHandler)
+        cls.url = f"http://127.0.0.1:{cls.server.server_port}/resource/{{}}.csv"
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.store = snapshots.SnapshotStore(self.path)
+        self.patch = mock.patch.object(schools, "OPEN_DATA_URL", self.url)
+        self.patch.start()
+
+    def tearDown(self):
+        self.patch.stop()
+        shutil.rmtree(self.path)
+
+    def test_loads_every_dataset(self):
+        data = schools.load_all(self.store)
+        self.assertEqual(set(data.timings), set(schools.LOADERS))
+        self.assertIn("clean_name", data.demographics.columns)
+        self.assertIn("all", data.math.category.values)
+        self.assertEqual(len(data.ela), len(schools.clean_test_data_categories(
+            synthetic.make_tests(30, seed=1))))
+        self.assertIn("school_name", data.charter_math.columns)
+
+    def test_downloads_at_the_same_time(self):
+        SlowPortalHandler.most_active = 0
+        data = schools.load_all(self.store)
+        # every download was in flight while the server slept on the first
+        self.assertEqual(SlowPortalHandler.most_active, len(schools.LOADERS))
+        self.assertGreater(min(data.timings.values()), SlowPortalHandler.delay)
+
+    def test_some_datasets(self):
+        data = schools.load_all(self.store, datasets=["math"], compact=True)
+        self.assertIsNone(data.demographics)
+        self.assertEqual(list(data.timings), ["math"])
+        self.assertEqual(data.math.category.dtype, "category")
+
+    def test_unknown_dataset(self):
+        with self.assertRaises(ValueError):
+            schools.load_all(self.store, datasets=["science"])
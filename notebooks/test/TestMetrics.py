@@ -0,0 +1,111 @@
+import os
+import tempfile
+import timeit
+import unittest
+from unittest import mock
+
+import pandas as pd
+from school_data import metrics, schools, snapshots, synthetic
+
+# the timing comparison only runs when this is set, it depends on the
+# machine more than the other tests
+BENCHMARKS = os.environ.get("SCHOOL_DATA_BENCHMARKS") == "1"
+
+
+@metrics.timed()
+def make_frame(n):
+    return pd.DataFrame({"a": range(n)})
+
+
+@metrics.timed("outer")
+def outer(n):
+    return [make_frame(n), make_frame(n)]
+
+
+def plain(n):
+    return n
+
+
+class MetricsTestCase(unittest.TestCase):
+    def setUp(self):
+        metrics.reset()
+        self.events = []
+        metrics.add_listener(self.listen)
+
+    def tearDown(self):
+        metrics.remove_listener(self.listen)
+        metrics.disable()
+        metrics.reset()
+
+    def listen(self, stage, record):
+        self.events.append((stage, record))
+
+    def test_off_by_default(self):
+        make_frame(3)
+        with metrics.stage("block"):
+            pass
+        self.assertEqual(metrics.report(), {})
+        self.assertEqual(self.events, [])
+
+    def test_records_stages(self):
+        metrics.enable()
+        make_frame(3)
+        make_frame(5)
+        with metrics.stage("block") as stage:
+            stage.rows = 7
+
+        report = metrics.report()
+        self.assertEqual(report["make_frame"]["calls"], 2)
+        self.assertEqual(report["make_frame"]["rows"], 5)
+        self.assertTrue(report["make_frame"]["total_seconds"] >= report["make_frame"]["seconds"])
+        self.assertIsNone(report["make_frame"]["peak_mb"])
+        self.assertEqual(report["block"]["rows"], 7)
+        self.assertEqual([stage for stage, _ in self.events], ["make_frame", "make_frame", "block"])
+
+    def test_memory(self):
+        metrics.enable(memory=True)
+        outer(100000)
+        report = metrics.report()
+        self.assertIsNone(report["make_frame"]["peak_mb"])
+        self.assertTrue(report["outer"]["peak_mb"] > .5)
+        self.assertEqual(report["outer"]["rows"], 2)
+
+    def test_failed_stage_is_not_recorded(self):
+        metrics.enable()
+        with self.assertRaises(ValueError):
+            with metrics.stage("broken"):
+                raise ValueError()
+        self.assertNotIn("broken", metrics.report())
+
+    def test_pipeline_stages(self):
+        metrics.enable()
+        df = schools.clean_demographics(synthetic.make_demographics(50))
+        schools.find_school(df, "high school")
+        with tempfile.TemporaryDirectory() as tmp:
+            store = snapshots.SnapshotStore(tmp, offline=True)
+            store.write(df, schools.DEMOGRAPHICS_ID, schools.DEMOGRAPHICS_SCHEMA)
+            schools.load_demographics(store=store)
+
+        report = metrics.report()
+        self.assertEqual(report["clean_demographics"]["rows"], len(df))
+        for stage in ["find_school", "read_snapshot", "load_demographics"]:
+            self.assertEqual(report[stage]["calls"], 1)
+
+    def test_disabled_does_no_work(self):
+        timed = metrics.timed()(plain)
+        with mock.patch.object(metrics, "Stage") as stage, \
+                mock.patch.object(metrics.time, "perf_counter") as clock:
+            self.assertEqual(timed(1), 1)
+            self.assertIs(metrics.stage("block"), metrics._OFF)
+        stage.assert_not_called()
+        clock.assert_not_called()
+        self.assertEqual(metrics.report(), {})
+        self.assertEqual(self.events, [])
+
+    @unittest.skipUnless(BENCHMARKS, "set SCHOOL_DATA_BENCHMARKS=1 to time the disabled overhead")
+    def test_disabled_cost(self):
+        timed = metrics.timed()(plain)
+        extra = min(timeit.repeat(lambda: timed(1), number=10000, repeat=3)) - \
+            min(timeit.repeat(lambda: plain(1), number=10000, repeat=3))
+        # well under a microsecond a call
+        self.assertLess(extra / 10000, 1e-6)
@@ -0,0 +1,53 @@
+import io
+import unittest
+from unittest import mock
+
+import pandas as pd
+from school_data import normalize, schools, synthetic
+from benchmarks import baseline
+
+NAMES = ["P.S. 015 Roberto Clemente", "J.H.S. 088 Peter Rouget", "I.S. 000 Test",
+    "ms 9 and ms 9x", "this is a test", "ps  07 two spaces", "the +5 school",
+    "school 1_0", "  Spaced Out  ", "M. S. 2 Something"]
+
+
+class NormalizeTestCase(unittest.TestCase):
+    def test_clean_name_matches_original(self):
+        for name in NAMES:
+            self.assertEqual(normalize.clean_name(name), baseline.clean_name(name))
+
+    def test_lookup(self):
+        table = normalize.NameTable()
+        clean, prefixes = table.lookup(NAMES)
+        self.assertEqual(list(clean), [baseline.clean_name(name) for name in NAMES])
+        self.assertEqual(list(prefixes),
+            ["PS", None, "IS", None, None, None, None, None, None, "MS"])
+
+    def test_only_new_names_are_normalized(self):
+        table = normalize.NameTable()
+        table.lookup(NAMES[:4])
+        with mock.patch.object(normalize, "clean_names", wraps=normalize.clean_names) as clean_names:
+            clean, _ = table.lookup(NAMES)
+            self.assertEqual(list(clean_names.call_args[0][0]), NAMES[4:])
+            table.lookup(NAMES[::-1])
+            self.assertEqual(clean_names.call_count, 1)
+        self.assertEqual(len(table), len(NAMES))
+
+    def test_reload_reuses_names(self):
+        raw = synthetic.make_demographics(100)
+        raw = pd.read_csv(io.StringIO(raw.to_csv(index=False)))
+        with mock.patch.object(normalize, "NAMES", normalize.NameTable()):
+            first = schools.clean_demographics(raw.copy())
+            with mock.patch.object(normalize, "clean_names") as clean_names:
+                second = schools.clean_demographics(raw.copy())
+            clean_names.assert_not_called()
+        pd.testing.assert_frame_equal(first, second)
+
+    def test_parse_school(self):
+        self.assertEqual(normalize.parse_school("ms88 in brooklyn"), "ms 88 in brooklyn")
+        self.assertEqual(normalize.parse_school("show me PS9"), "show me PS 9")
+        self.assertEqual(normalize.query("ms 88"), "ms 88")
+
+    def test_query(self):
+        self.assertEqual(normalize.query("  Show me  MS88 "), "show me ms 88")
+        self.assertEqual(normalize.query("roberto   clemente"), "roberto clemente")
@@ -0,0 +1,48 @@
+import json
+import unittest
+from unittest import mock
+
+from school_data import payloads, schema, schools, synthetic
+
+
+class SchoolListTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.df = schools.clean_demographics(synthetic.make_demographics(400))
+        cls.matches = schools.find_school(cls.df, "high school")
+
+    def test_fields_and_order(self):
+        payload = payloads.school_list(self.matches, page_size=len(self.matches))
+        self.assertEqual(payload["fields"], payloads.LIST_FIELDS)
+        self.assertEqual([row[0] for row in payload["rows"]], self.matches.dbn.tolist())
+        self.assertEqual([row[3] for row in payload["rows"]], self.matches.match.tolist())
+        self.assertEqual(payload["total"], len(self.matches))
+        self.assertEqual(payload["pages"], 1)
+
+    def test_pages(self):
+        total = len(self.matches)
+        self.assertTrue(total > 10)
+        rows = []
+        for page in range(payloads.school_list(self.matches, page_size=4)["pages"]):
+            payload = payloads.school_list(self.matches, page, page_size=4)
+            self.assertTrue(len(payload["rows"]) <= 4)
+            rows += payload["rows"]
+        self.assertEqual([row[0] for row in rows], self.matches.dbn.tolist())
+        self.assertEqual(payloads.school_list(self.matches, total, page_size=4)["rows"], [])
+
+    def test_short_name_results_have_no_match(self):
+        sn = self.df.short_name.iloc[-1]
+        payload = payloads.school_list(schools.find_school(self.df, sn))
+        self.assertTrue(len(payload["rows"]) > 0)
+        self.assertTrue(all(row[1] == sn and row[3] is None for row in payload["rows"]))
+
+    def test_compact_frame(self):
+        compact = schema.compact(self.df, schema.DEMOGRAPHICS)
+        payload = payloads.school_list(schools.find_school(compact, "high school"))
+        self.assertEqual(payload, payloads.school_list(self.matches))
+
+    def test_dumps_is_plain_json(self):
+        payload = payloads.school_list(self.matches)
+        self.assertEqual(json.loads(payloads.dumps(payload)), payload)
+        with mock.patch.object(payloads, "orjson", None):
+            self.assertEqual(json.loads(payloads.dumps(payload)), payload)
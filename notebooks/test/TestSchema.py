@@ -0,0 +1,87 @@
+import io
+import unittest
+
+import numpy as np
+import pandas as pd
+from school_data import schema, schools, synthetic
+
+
+class CompactDemographicsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.df = schools.clean_demographics(synthetic.make_demographics(200))
+        self.compact = schema.compact(self.df, schema.DEMOGRAPHICS)
+
+    def test_dtypes(self):
+        self.assertEqual(self.compact.boro_name.dtype, "category")
+        self.assertEqual(self.compact.year.dtype, np.int16)
+        self.assertEqual(self.compact.district.dtype, np.int8)
+        self.assertEqual(self.compact.total_enrollment.dtype, np.int16)
+        self.assertEqual(self.compact.poverty.dtype, "Int32")
+        self.assertEqual(list(self.compact.columns), list(self.df.columns))
+
+    def test_same_values(self):
+        for col in ["dbn", "clean_name", "short_name", "year", "black", "black_1"]:
+            self.assertEqual(self.compact[col].tolist(), self.df[col].tolist())
+
+    def test_suppressed_poverty_is_missing(self):
+        text = self.df.poverty.isin(["Above 95%", "Below 5%"])
+        self.assertTrue(self.compact.poverty[text].isna().all())
+        self.assertEqual(self.compact.poverty[~text].tolist(), self.df.poverty[~text].astype(int).tolist())
+
+    def test_smaller(self):
+        before = self.df.memory_usage(deep=True).sum()
+        after = self.compact.memory_usage(deep=True).sum()
+        self.assertLess(after * 3, before)
+
+    def test_calc_districts(self):
+        districts = schools.calc_districts(self.compact)
+        self.assertEqual(districts.total_enrollment.sum(), self.df.total_enrollment.sum())
+
+    def test_find_school(self):
+        for qry in ["roberto clemente", "PS 9", "zzzz"]:
+            expected = schools.find_school(self.df, qry)
+            result = schools.find_school(self.compact, qry)
+            self.assertEqual(list(result.index), list(expected.index))
+
+
+class CompactTestsTestCase(unittest.TestCase):
+    def setUp(self):
+        raw = synthetic.make_tests(50)
+        raw = pd.read_csv(io.StringIO(raw.to_csv(index=False)))
+        self.df = schools.clean_test_data_categories(raw)
+        self.compact = schema.compact(self.df, schema.TESTS)
+
+    def test_suppressed_results_are_missing(self):
+        suppressed = self.df.mean_scale_score == "s"
+        self.assertTrue(suppressed.any())
+        self.assertTrue(self.compact.mean_scale_score[suppressed].isna().all())
+        self.assertEqual(self.compact.level_1.dtype, "Int32")
+        self.assertEqual(self.compact.level_1_1.dtype, "Float64")
+        self.assertEqual(self.compact.level_1[~suppressed].tolist(),
+            self.df.level_1[~suppressed].astype(int).tolist())
+
+    def test_smaller(self):
+        before = self.df.memory_usage(deep=True).sum()
+        after = self.compact.memory_usage(deep=True).sum()
+        self.assertLess(after * 3, before)
+
+
+class ConvertTestCase(unittest.TestCase):
+    def test_counts_grow_to_fit(self):
+        self.assertEqual(schema.to_count(pd.Series([1, 2])).dtype, np.int16)
+        self.assertEqual(schema.to_count(pd.Series([1, 40000])).dtype, np.int32)
+        self.assertEqual(schema.to_count(pd.Series([], dtype=np.int64)).dtype, np.int16)
+
+    def test_fixed_width_out_of_range(self):
+        with self.assertRaises(ValueError):
+            schema.compact(pd.DataFrame({"district": [1, 300]}), schema.DEMOGRAPHICS)
+
+    def test_unknown_marker(self):
+        with self.assertRaises(ValueError):
+            schema.to_nullable(pd.Series(["1", "x"]), "Int32")
+
+    def test_to_number(self):
+        numbers = schema.to_number(pd.Series(["12", "Above 95%", "Below 5%", "x", None]))
+        np.testing.assert_array_equal(numbers, [12, np.nan, np.nan, np.nan, np.nan])
+        counts = pd.Series([1, 2], dtype="Int32")
+        self.assertIs(schema.to_number(counts), counts)
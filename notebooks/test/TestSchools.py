@@ -1,38 +1,56 @@
+import io
 import unittest
+from unittest import mock
 import pandas as pd
 import numpy as np
-from school_data import schools
+from school_data import schema, schools, sources, synthetic
+from benchmarks import baseline
+from test import fixtures
+
+
+# the columns of the demographic data on the open data portal
+OPEN_DATA_COLS = pd.Index(['dbn', 'school_name', 'year', 'total_enrollment',
+            'grade_3k_pk_half_day_full', 'grade_k', 'grade_1', 'grade_2', 'grade_3',
+            'grade_4', 'grade_5', 'grade_6', 'grade_7', 'grade_8', 'grade_9',
+            'grade_10', 'grade_11', 'grade_12', 'female', 'female_1', 'male',
+            'male_1', 'asian', 'asian_1', 'black', 'black_1', 'hispanic',
+            'hispanic_1', 'multiple_race_categories', 'multiple_race_categories_1',
+            'white', 'white_1', 'students_with_disabilities',
+            'students_with_disabilities_1', 'english_language_learners',
+            'english_language_learners_1', 'poverty', 'poverty_1',
+            'economic_need_index'],
+            dtype='object')
 
 
 class LoadDemographicsTestCase(unittest.TestCase):
     def setUp(self):
-        df = schools.load_demo_open_data()
+        df = fixtures.load(schools.load_demo_open_data)
         self.assertIsNotNone(df, "failed to load dataframe")
         self.df = df
 
-
+    @unittest.skipUnless(fixtures.LIVE, "set SCHOOL_DATA_LIVE=1 to check the open data portal")
     def test_load_demographics(self):
         df = self.df
         self.assertIsNotNone(df, "failed to load dataframe")
         num_records = len(df)
         self.assertTrue(num_records in range(8500, 10800), f"Unexpected number of school records found: {num_records}")
 
+    @unittest.skipUnless(fixtures.LIVE, "set SCHOOL_DATA_LIVE=1 to check the open data portal")
     def test_expected_cols(self):
         "Test to make sure that the columns from open data haven't changed"
 
         a = np.array(self.df.columns)
-        b = pd.Index(['dbn', 'school_name', 'year', 'total_enrollment',
-            'grade_3k_pk_half_day_full', 'grade_k', 'grade_1', 'grade_2', 'grade_3',
-            'grade_4', 'grade_5', 'grade_6', 'grade_7', 'grade_8', 'grade_9',
-            'grade_10', 'grade_11', 'grade_12', 'female', 'female_1', 'male',
-            'male_1', 'asian', 'asian_1', 'black', 'black_1', 'hispanic',
-            'hispanic_1', 'multiple_race_categories', 'multiple_race_categories_1',
-            'white', 'white_1', 'students_with_disabilities',
-            'students_with_disabilities_1', 'english_language_learners',
-            'english_language_learners_1', 'poverty', 'poverty_1',
-            'economic_need_index'],
-            dtype='object')
-        self.assertTrue(np.array_equal(a, b), "Columns from live data don't match development cols")
+        self.assertTrue(np.array_equal(a, OPEN_DATA_COLS), "Columns from live data don't match development cols")
+
+    @unittest.skipIf(fixtures.LIVE, "checks the frozen fixture")
+    def test_fixture_has_open_data_cols(self):
+        "the synthetic fixture has the columns the portal had when it was made"
+        self.assertTrue(np.array_equal(np.array(self.df.columns), OPEN_DATA_COLS))
+
+    @unittest.skipIf(fixtures.LIVE, "checks the frozen fixture")
+    def test_fixture_rows(self):
+        "the fixture is 1800 synthetic schools over five years, about the size of the portal's data"
+        self.assertEqual(len(self.df), 1800 * 5)
 
 
 
@@ -40,12 +58,12 @@ class LoadDemographicsTestCase(unittest.TestCase):
 
 class CleanDemographicsTestCase(unittest.TestCase):
     def setUp(self):
-        df = schools.load_demographics()
+        df = fixtures.load(schools.load_demographics)
         self.df = df
 
 
     def test_load_demographics(self):
-        df = schools.load_demo_open_data()
+        df = fixtures.load(schools.load_demo_open_data)
         self.assertIsNotNone(df, "failed to load dataframe")
 
     def test_pct_to_float(self):
@@ -73,3 +91,130 @@ class CleanDemographicsTestCase(unittest.TestCase):
 
             self.assertTrue(high <= 1, f"Found max pct of {high} in {series.name}")
             self.assertTrue(low >= 0, f"Found min pct of {low} in {series.name}")
+
+
+class SourcesTestCase(unittest.TestCase):
+    def test_frame_source(self):
+        raw = synthetic.make_demographics(20)
+        source = sources.FrameSource({schools.DEMOGRAPHICS_ID: raw})
+        df = schools.load_demographics(source=source)
+        self.assertIn("clean_name", df.columns)
+        self.assertNotIn("clean_name", raw.columns)
+
+    def test_file_source(self):
+        df = schools.load_demo_open_data(source=sources.FileSource(fixtures.DATA_DIR))
+        self.assertEqual(len(df), 9000)
+        with self.assertRaises(FileNotFoundError):
+            schools.load_math_tests(source=sources.FileSource(fixtures.DATA_DIR))
+
+    def test_fixtures_are_loaded_once(self):
+        first = fixtures.load(schools.load_demographics)
+        with mock.patch.object(schools, "clean_demographics") as clean:
+            second = fixtures.load(schools.load_demographics)
+        clean.assert_not_called()
+        pd.testing.assert_frame_equal(first, second)
+        self.assertIsNot(first, second)
+
+
+class VectorizedCleaningTestCase(unittest.TestCase):
+    def setUp(self):
+        # round trip through csv so the dtypes are the ones read_csv makes
+        raw = synthetic.make_demographics(300)
+        self.raw = pd.read_csv(io.StringIO(raw.to_csv(index=False)))
+
+    def test_matches_row_wise_cleaning(self):
+        expected = baseline.clean_demographics(self.raw.copy())
+        df = schools.clean_demographics(self.raw.copy())
+        pd.testing.assert_frame_equal(df, expected, check_exact=True)
+
+    def test_clean_names(self):
+        names = pd.Series(["P.S. 015 Roberto Clemente", "J.H.S. 088 Peter Rouget",
+            "I.S. 000 Test", "ms 9 and ms 9x", "this is a test", "ps  07 two spaces",
+            "the +5 school", "school 1_0", "  Spaced Out  "])
+        expected = [schools.clean_name(sn) for sn in names]
+        self.assertEqual(list(schools.clean_names(names)), expected)
+
+    def test_pcts_to_floats(self):
+        series = pd.Series(["72.1%", "Below 5%", "Above 95%", np.nan, "0.5"], dtype=object)
+        result = schools.pcts_to_floats(series)
+        self.assertEqual(result.dtype, np.float64)
+        np.testing.assert_allclose(result, [.721, .04, .96, np.nan, .5])
+
+
+class CombineTestDataTestCase(unittest.TestCase):
+    def setUp(self):
+        self.df = schools.clean_demographics(synthetic.make_demographics(60, years=range(2015, 2018)))
+        raw = synthetic.make_tests(60, years=range(2015, 2018))
+        # round trip through CSV so the dtypes are the ones read_csv gives
+        raw = pd.read_csv(io.StringIO(raw.to_csv(index=False)))
+        self.tests = schools.clean_test_data_categories(raw)
+
+    def test_matches_merge_per_combination(self):
+        expected = baseline.combine_test_data(self.df, self.tests, "math")
+        result = schools.combine_test_data(self.df, self.tests, "math")
+        pd.testing.assert_frame_equal(expected, result, check_exact=True)
+
+    def test_schools_with_all_results_keep_int_columns(self):
+        df = self.df[self.df.dbn.isin(self.tests.dbn)]
+        expected = baseline.combine_test_data(df, self.tests, "ela")
+        result = schools.combine_test_data(df, self.tests, "ela")
+        pd.testing.assert_frame_equal(expected, result, check_exact=True)
+        self.assertEqual(result["ela_all_grade_all_number_tested"].dtype, np.int64)
+
+    def test_combination_without_results(self):
+        # a grade that only appears in a category with no rows for it
+        row = self.tests.iloc[[0]].assign(category="asian", grade="9")
+        tests = pd.concat([self.tests[self.tests.category != "asian"], row], ignore_index=True)
+        expected = baseline.combine_test_data(self.df, tests, "ela")
+        result = schools.combine_test_data(self.df, tests, "ela")
+        pd.testing.assert_frame_equal(expected, result, check_exact=True)
+
+    def test_compact_results(self):
+        tests = schema.compact(self.tests, schema.TESTS)
+        expected = schools.merge_per_combination(self.df, tests, schools.make_test_cols(tests), "math")
+        result = schools.combine_test_data(self.df, tests, "math")
+        pd.testing.assert_frame_equal(expected, result, check_exact=True)
+
+    def test_duplicated_rows(self):
+        # the portal sometimes lists a (dbn, year, category, grade) twice
+        tests = pd.concat([self.tests, self.tests.iloc[[3]]], ignore_index=True)
+        expected = baseline.combine_test_data(self.df, tests, "math")
+        result = schools.combine_test_data(self.df, tests, "math")
+        pd.testing.assert_frame_equal(expected, result, check_exact=True)
+        self.assertEqual(len(result), len(self.df) + 1)
+
+
+class CalcChangesTestCase(unittest.TestCase):
+    def setUp(self):
+        df = schools.clean_demographics(synthetic.make_demographics(80))
+        # a few schools that opened after 2015, and one that missed 2016 too
+        self.missing = df.dbn.unique()[:5]
+        gone = df.dbn.isin(self.missing) & (df.year == 2015)
+        gone |= (df.dbn == self.missing[0]) & (df.year == 2016)
+        self.df = df[~gone]
+
+    def test_matches_row_by_row_changes(self):
+        expected = baseline.calc_changes(self.df, 2015, 2019, "poverty_1")
+        result = schools.calc_changes(self.df, 2015, 2019, "poverty_1", fallback="zero")
+        np.testing.assert_allclose(result.poverty_1_change, expected)
+        self.assertTrue(result.index.equals(expected.index))
+
+    def test_nearest_year(self):
+        result = schools.calc_changes(self.df, 2015, 2019, ["black", "poverty_1"]).set_index("dbn")
+        self.assertEqual(result.start_year[self.missing[0]], 2017)
+        self.assertTrue((result.start_year[self.missing[1:]] == 2016).all())
+        self.assertEqual((result.start_year == 2015).sum(), len(result) - len(self.missing))
+
+        by_year = self.df.set_index(["dbn", "year"])
+        dbn = self.missing[1]
+        self.assertEqual(result.black_change[dbn],
+            by_year.black[(dbn, 2019)] - by_year.black[(dbn, 2016)])
+
+    def test_no_fallback(self):
+        result = schools.calc_changes(self.df, 2015, 2019, "black", fallback=None).set_index("dbn")
+        self.assertTrue(result.black_change[self.missing].isna().all())
+        self.assertEqual(result.black_change.notna().sum(), len(result) - len(self.missing))
+
+    def test_unknown_fallback(self):
+        with self.assertRaises(ValueError):
+            schools.calc_changes(self.df, 2015, 2019, "black", fallback="closest")
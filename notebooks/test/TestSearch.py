@@ -0,0 +1,135 @@
+import unittest
+import pandas as pd
+from school_data import schema, schools, search, synthetic
+from benchmarks import baseline
+
+
+class FindSchoolTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.df = schools.clean_demographics(synthetic.make_demographics(400))
+
+    def test_same_results_as_full_scan(self):
+        queries = ["roberto clemente", "PS 15", "peter rouget", "sunset park high",
+            "high school", "the", "robrto clemnte", "liberti", "jhs 88", "xyz", ""]
+        for qry in queries:
+            expected = baseline.find_school(self.df, qry)
+            pd.testing.assert_frame_equal(schools.find_school(self.df, qry), expected)
+
+    def test_short_name(self):
+        sn = self.df.short_name.iloc[-1]
+        t = schools.find_school(self.df, sn.lower())
+        self.assertTrue(len(t) > 0)
+        self.assertTrue((t.short_name == sn).all())
+        self.assertTrue((t.year == self.df.year.max()).all())
+
+    def test_apostrophe(self):
+        t = schools.find_school(self.df, "O'Brien")
+        self.assertTrue(len(t) > 0)
+        self.assertTrue(t.clean_name.str.contains("o'brien").all())
+
+    def test_index_is_reused(self):
+        index = search.school_index(self.df)
+        self.assertIs(search.school_index(self.df), index)
+        self.assertIsNot(search.school_index(self.df.copy()), index)
+
+    def test_replaced_columns(self):
+        for df in [self.df.copy(), schema.compact(self.df, schema.DEMOGRAPHICS)]:
+            index = search.school_index(df)
+            self.assertIs(search.school_index(df), index)
+            sn = df.short_name.iloc[-1]
+            df["short_name"] = df.short_name.astype(object).str.replace(sn, "ZZ 1", regex=False)
+            self.assertIsNot(search.school_index(df), index)
+            self.assertEqual(len(schools.find_school(df, sn)), 0)
+            self.assertTrue(len(schools.find_school(df, "zz 1")) > 0)
+
+    def test_forget(self):
+        df = self.df.copy()
+        index = search.school_index(df)
+        df.loc[df.year == df.year.max(), "short_name"] = "ZZ 1"
+        search.forget(df)
+        self.assertIsNot(search.school_index(df), index)
+        self.assertTrue(len(schools.find_school(df, "zz 1")) > 0)
+
+    def test_candidates_include_every_match(self):
+        index = search.school_index(self.df)
+        for qry in ["roberto clemente", "ana silvr", "pan amercan", "museum"]:
+            candidates = set(index.names[index.candidates(qry)])
+            for name in index.names:
+                if search.fuzz.token_set_ratio(qry, name) > search.MIN_MATCH:
+                    self.assertIn(name, candidates)
+
+
+class ResolveSchoolsTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.df = schools.clean_demographics(synthetic.make_demographics(300))
+        cls.latest = cls.df[cls.df.year == cls.df.year.max()]
+
+    def test_same_best_match_as_find_school(self):
+        names = list(self.latest.school_name.sample(40, random_state=0)) + ["robrto clemnte", "xyz"]
+        result = schools.resolve_schools(self.df, names)
+        self.assertEqual(result.input.tolist(), names)
+        for row in result.itertuples():
+            t = schools.find_school(self.df, schools.clean_name(row.input))
+            if len(t) == 0:
+                self.assertTrue(pd.isna(row.dbn))
+                continue
+            best = t[t.match == t.match.max()]
+            self.assertEqual(row.score, best.match.iloc[0])
+            self.assertEqual(row.dbn, best.dbn.min())
+            self.assertEqual(row.ambiguous, len(best) > 1)
+
+    def test_short_names_and_top_k(self):
+        sn = self.latest.short_name.iloc[0]
+        name = self.latest.school_name.iloc[1]
+        result = schools.resolve_schools(self.df, [sn.lower(), name], top_k=3)
+        short = result[result.input == sn.lower()]
+        self.assertEqual(set(short.dbn), set(self.latest.dbn[self.latest.short_name == sn]))
+        self.assertTrue((short.score == 100).all())
+        fuzzy = result[result.input == name]
+        self.assertEqual(fuzzy["rank"].tolist(), list(range(1, len(fuzzy) + 1)))
+        self.assertTrue(fuzzy.score.is_monotonic_decreasing)
+
+    def test_missing_names(self):
+        names = [self.latest.school_name.iloc[0], None, float("nan"), ""]
+        result = schools.resolve_schools(self.df, names)
+        self.assertEqual(len(result), 4)
+        alone = schools.resolve_schools(self.df, names[:1])
+        self.assertEqual(result.dbn.iloc[0], alone.dbn.iloc[0])
+        self.assertTrue(result.dbn.iloc[1:3].isna().all())
+        self.assertTrue(result["rank"].iloc[1:3].isna().all())
+        self.assertFalse(result.ambiguous.iloc[1:3].any())
+
+    def test_year(self):
+        year = self.df.year.min()
+        result = schools.resolve_schools(self.df, self.latest.school_name.head(5), year=year)
+        self.assertTrue(self.df[self.df.year == year].dbn.isin(result.dbn.dropna()).any())
+        self.assertIsNot(search.school_index(self.df, year), search.school_index(self.df))
+
+    def test_processes(self):
+        names = list(self.latest.school_name.head(30))
+        one = schools.resolve_schools(self.df, names, top_k=2)
+        pd.testing.assert_frame_equal(schools.resolve_schools(self.df, names, top_k=2, n_jobs=2), one)
+
+
+class QueryCacheTestCase(unittest.TestCase):
+    def test_least_recently_used_is_dropped(self):
+        cache = search.QueryCache(maxsize=2)
+        cache.put((1, "a"), "A")
+        cache.put((1, "b"), "B")
+        self.assertEqual(cache.get((1, "a")), "A")
+        cache.put((1, "c"), "C")
+        self.assertIsNone(cache.get((1, "b")))
+        self.assertEqual(cache.get((1, "c")), "C")
+        self.assertEqual(cache.stats(), {"hits": 2, "misses": 1, "size": 2})
+
+    def test_versions_and_clear(self):
+        cache = search.QueryCache()
+        cache.put((1, "ps 9"), "old")
+        self.assertIsNone(cache.get((2, "ps 9")))
+        cache.clear()
+        self.assertIsNone(cache.get((1, "ps 9")))
+
+    def test_normalize_query(self):
+        self.assertEqual(search.normalize_query("  PS   9 "), "ps 9")
@@ -0,0 +1,154 @@
+import os
+import random
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+from ksdisc.ksdisc import _calc2sampleKS
+from school_data import schools, segregation, synthetic
+from benchmarks import baseline
+
+
+def small_schools(n_schools=6, years=range(2018, 2020)):
+    """a few small schools, so the original row-by-row test runs quickly"""
+    df = schools.clean_demographics(synthetic.make_demographics(n_schools, years))
+    for race in segregation.RACES:
+        df[race] = df[race] // 10
+    df["total_enrollment"] = df[segregation.RACES].sum(axis=1)
+    return df
+
+
+def expand(counts):
+    """turn counts per category into the list of samples ksdisc expects"""
+    return [float(i + 1) for i, n in enumerate(counts) for _ in range(n)]
+
+
+class SegregationTestCase(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.mkdtemp()
+        os.chdir(self.tmp)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+
+    def test_matches_row_by_row_test(self):
+        df = small_schools()
+        random.seed(1)
+        chi2_p, chi2, ks_p = baseline.segregation_test(df)
+        # the default is the statistic the original test computed
+        result = schools.segregation_test(df, seed=1)
+
+        np.testing.assert_allclose(result.p_value_chi2test, chi2_p, rtol=1e-9)
+        np.testing.assert_allclose(result.chi2_value_chi2test, chi2, rtol=1e-9)
+        # the KS p-values are permutation tests, they only agree up to
+        # the noise of 1000 random permutations
+        np.testing.assert_allclose(result.p_value_KStest, ks_p, atol=.1)
+
+    def test_results_are_keyed_by_school_and_year(self):
+        df = small_schools().sample(frac=1, random_state=0)
+        result = schools.segregation_test(df, seed=0)
+        self.assertEqual(list(result.columns), ["dbn", "year", "p_value_chi2test",
+            "chi2_value_chi2test", "p_value_KStest"])
+        self.assertTrue(result.index.equals(df.index))
+        self.assertTrue((result.dbn == df.dbn).all())
+        self.assertTrue((result.year == df.year).all())
+        # nothing is written unless asked for
+        self.assertEqual(os.listdir(self.tmp), [])
+
+    def test_output_files(self):
+        df = small_schools()
+        for name, read in [("out.parquet", pd.read_parquet), ("out.feather", pd.read_feather),
+                ("out.csv", lambda path: pd.read_csv(path, index_col=0))]:
+            result = schools.segregation_test(df, seed=0, output=name)
+            saved = read(name)
+            if name.endswith(".feather"):
+                saved = saved.set_index("index").rename_axis(None)
+            pd.testing.assert_frame_equal(saved, result, check_dtype=False)
+
+        with self.assertRaises(ValueError):
+            schools.segregation_test(df, seed=0, output="out.xlsx")
+
+    def test_ksdisc_statistic(self):
+        rng = np.random.default_rng(0)
+        for _ in range(500):
+            a = rng.integers(0, 6, 5) * rng.integers(0, 2, 5)
+            b = rng.integers(0, 6, 5)
+            if a.sum() == 0 or b.sum() == 0:
+                continue
+            expected = _calc2sampleKS(expand(a), expand(b))
+            self.assertAlmostEqual(segregation.ksdisc_statistic(a, b), expected)
+            if a.sum() == b.sum():
+                self.assertAlmostEqual(segregation.ks_statistic(a, b), expected)
+
+    def test_permutation_counts(self):
+        rng = np.random.default_rng(0)
+        pooled = np.array([[5, 0, 7, 3, 1], [0, 0, 2, 0, 0]])
+        n1 = np.array([8, 1])
+        draws = segregation.permutation_counts(pooled, n1, 200, rng)
+        self.assertEqual(draws.shape, (2, 200, 5))
+        self.assertTrue((draws.sum(axis=2) == n1[:, None]).all())
+        self.assertTrue((draws >= 0).all() and (draws <= pooled[:, None, :]).all())
+
+    def test_empty_samples(self):
+        a = np.array([[0, 0, 0, 0, 0], [3, 2, 1, 0, 0]])
+        b = np.array([[1, 2, 0, 0, 0], [3, 2, 1, 0, 0]])
+        pvalues = segregation.ks_pvalues(a, b, seed=0)
+        self.assertTrue(np.isnan(pvalues[0]))
+        self.assertTrue(pvalues[1] > .5)
+
+    def test_seed_is_deterministic(self):
+        df = small_schools()
+        for ks in ["exact", "legacy"]:
+            first = schools.segregation_test(df, ks=ks, seed=7)
+            second = schools.segregation_test(df, ks=ks, seed=7)
+            pd.testing.assert_frame_equal(first, second)
+
+    def test_exact_mode_keeps_every_student(self):
+        df = small_schools()
+        observed, expected = segregation.observed_expected(df)
+        sample1 = np.rint(expected).astype(int)
+        sample2 = observed.astype(int)
+        exact = segregation.ks_pvalues(sample1, sample2, seed=3)
+        _, _, ks_p = segregation.segregation_stats(df, ks="exact", seed=3)
+        np.testing.assert_array_equal(ks_p, exact)
+
+    def test_unequal_sizes(self):
+        # the same mix of students, one sample twice the size of the other
+        a = np.array([[10, 20, 30, 5, 5]])
+        b = 2 * a
+        self.assertEqual(segregation.ks_statistic(a, b)[0], 0)
+        self.assertTrue(segregation.ks_pvalues(a, b, seed=0)[0] > .9)
+        # ksdisc finds a gap part way through the tied values
+        self.assertTrue(segregation.ksdisc_statistic(a, b)[0] > 0)
+
+    def test_unknown_mode(self):
+        with self.assertRaises(ValueError):
+            segregation.segregation_stats(small_schools(), ks="fast")
+
+
+class PartitionedSegregationTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.df = small_schools(n_schools=40)
+        # shuffle the rows, the results have to come back in this order
+        cls.df = cls.df.sample(frac=1, random_state=0)
+
+    def test_same_chi_square_as_one_process(self):
+        chi2_p, chi2, ks_p = segregation.segregation_stats(self.df, seed=0)
+        result = segregation.partitioned_stats(self.df, n_jobs=1, seed=0)
+        np.testing.assert_allclose(result[0], chi2_p, rtol=1e-12)
+        np.testing.assert_allclose(result[1], chi2, rtol=1e-12)
+        self.assertFalse(np.isnan(result[2]).all())
+
+    def test_same_results_for_any_number_of_workers(self):
+        one = segregation.partitioned_stats(self.df, n_jobs=1, seed=3)
+        two = segregation.partitioned_stats(self.df, n_jobs=2, seed=3)
+        for a, b in zip(one, two):
+            np.testing.assert_array_equal(a, b)
+
+    def test_segregation_test_n_jobs(self):
+        result = schools.segregation_test(self.df, seed=3, n_jobs=2)
+        expected = segregation.partitioned_stats(self.df, n_jobs=1, seed=3)
+        np.testing.assert_array_equal(result.p_value_KStest, expected[2])
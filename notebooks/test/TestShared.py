@@ -0,0 +1,112 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+import pandas as pd
+import pyarrow as pa
+from school_data import schema, schools, shared, synthetic
+
+READER = """
+import sys
+from school_data import shared
+version, df = shared.SharedFrame(sys.argv[1], "demographics").read()
+print(version, len(df))
+"""
+
+
+class SharedFrameTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.demo = schools.clean_demographics(synthetic.make_demographics(200))
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.frame = shared.SharedFrame(self.tmp.name, shared.DEMOGRAPHICS)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_round_trip(self):
+        self.assertEqual(self.frame.publish(self.demo), 1)
+        version, df = self.frame.read()
+        self.assertEqual(version, 1)
+        pd.testing.assert_frame_equal(df, self.demo)
+
+    def test_round_trip_compact(self):
+        compact = schema.compact(self.demo, schema.DEMOGRAPHICS)
+        self.frame.publish(compact)
+        _, df = self.frame.read()
+        pd.testing.assert_frame_equal(df, compact)
+
+    def test_nothing_published(self):
+        self.assertEqual(self.frame.version(), 0)
+        with self.assertRaises(FileNotFoundError):
+            self.frame.read()
+
+    def test_versions_and_poll(self):
+        self.frame.publish(self.demo)
+        self.frame.read()
+        self.assertIsNone(self.frame.poll())
+
+        self.frame.publish(self.demo.head(10))
+        version, df = self.frame.poll()
+        self.assertEqual(version, 2)
+        self.assertEqual(len(df), 10)
+        self.assertIsNone(self.frame.poll())
+
+    def test_table_counts_as_read(self):
+        self.frame.publish(self.demo)
+        version, _ = self.frame.table()
+        self.assertEqual(self.frame.seen, version)
+        self.assertIsNone(self.frame.poll())
+
+    def test_same_source_is_not_published_again(self):
+        self.assertEqual(self.frame.publish(self.demo, source='"v1"'), 1)
+        self.assertEqual(self.frame.publish(self.demo.head(10), source='"v1"'), 1)
+        self.assertEqual(self.frame.table()[1].num_rows, len(self.demo))
+        self.assertEqual(self.frame.publish(self.demo.head(10), source='"v2"'), 2)
+        # without a source every publish is a new version
+        self.assertEqual(self.frame.publish(self.demo), 3)
+        self.assertEqual(self.frame.publish(self.demo), 4)
+
+    def test_schema_mismatch(self):
+        old = shared.SharedFrame(self.tmp.name, shared.DEMOGRAPHICS, schema="demographics-1-abc")
+        new = shared.demographics(self.tmp.name)
+        self.assertEqual(old.publish(self.demo, source='"v1"'), 1)
+        with self.assertRaises(ValueError):
+            new.read()
+        # the same portal data under a new schema is published again
+        self.assertEqual(new.publish(self.demo, source='"v1"'), 2)
+        self.assertEqual(new.read()[0], 2)
+        with self.assertRaises(ValueError):
+            old.table()
+
+    def test_schema_key(self):
+        key = shared.schema_key("demographics-2", schema.DEMOGRAPHICS)
+        self.assertTrue(key.startswith("demographics-2-"))
+        self.assertEqual(key, shared.schema_key("demographics-2", dict(reversed(schema.DEMOGRAPHICS.items()))))
+        changed = {**schema.DEMOGRAPHICS, "dbn": "string"}
+        self.assertNotEqual(key, shared.schema_key("demographics-2", changed))
+
+    def test_old_versions_removed(self):
+        for _ in range(5):
+            version = self.frame.publish(self.demo)
+        files = sorted(f for f in os.listdir(self.tmp.name) if f.endswith(".arrow"))
+        self.assertEqual(files, [f"demographics.{v}.arrow"
+            for v in range(version - shared.KEEP_VERSIONS + 1, version + 1)])
+
+    def test_table_is_memory_mapped(self):
+        self.frame.publish(self.demo)
+        before = pa.total_allocated_bytes()
+        _, table = self.frame.table()
+        self.assertEqual(pa.total_allocated_bytes(), before)
+        self.assertEqual(table.num_rows, len(self.demo))
+
+    def test_other_process(self):
+        self.frame.publish(self.demo)
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        out = subprocess.run([sys.executable, "-c", READER, self.tmp.name], cwd=root,
+            capture_output=True, text=True, check=True).stdout
+        self.assertEqual(out.split(), ["1", str(len(self.demo))])
@@ -0,0 +1,51 @@
+"""
+Frozen copies of the open data for the tests, loaded and cleaned once
+per test process.
+
+    df = fixtures.load(schools.load_demographics)
+
+The tests read the files in test/data by default. Set SCHOOL_DATA_LIVE=1
+to run the same tests against the open data portal instead.
+
+The files were made with `python -m test.fixtures`, which writes new
+ones from the synthetic data generator. They have the portal's columns
+but not its data, so the tests that check the portal hasn't changed
+(`LIVE` below) only run against the portal.
+"""
+import os
+
+from school_data import schools, sources, synthetic
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+
+# run against the open data portal instead of the files
+LIVE = os.environ.get("SCHOOL_DATA_LIVE", "") not in ("", "0")
+
+_frames = {}
+
+
+def source():
+    if LIVE:
+        return sources.HTTPSource(schools.OPEN_DATA_URL)
+    return sources.FileSource(DATA_DIR)
+
+
+def load(loader):
+    """
+    The frame `loader` (like schools.load_demographics) returns for the
+    fixture source, loaded the first time it's asked for. Each caller
+    gets its own copy.
+    """
+    if loader not in _frames:
+        _frames[loader] = loader(source=source())
+    return _frames[loader].copy()
+
+
+def freeze():
+    os.makedirs(DATA_DIR, exist_ok=True)
+    raw = synthetic.make_demographics(1800, seed=0)
+    raw.to_csv(os.path.join(DATA_DIR, schools.DEMOGRAPHICS_ID + ".csv.gz"), index=False)
+
+
+if __name__ == "__main__":
+    freeze()